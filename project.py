@@ -1,7 +1,21 @@
-import collections
-import os, csv, math, random
+import collections, itertools, contextlib
+import os, csv, math, random, json
+import sys, atexit, threading, queue, time, platform
+import struct, mmap, multiprocessing, hashlib
+import socket, socketserver
+import array
+try:
+    import fcntl
+except ImportError:     # Without fcntl, only one process may add to a shared cache
+    fcntl = None
+try:
+    import numpy
+except ImportError:     # Without numpy, outcome queries loop over the columns in Python
+    numpy = None
 from pathlib import Path
 import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from xml.sax.saxutils import escape, quoteattr
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
@@ -9,14 +23,83 @@ import tkinter
 
 
 Card = collections.namedtuple('Card', 'suit value')
+Equity = collections.namedtuple('Equity', 'ratio stderr samples evaluations')
+CaseResult = collections.namedtuple('CaseResult', 'name winner winners passed ranks')
+RangeEquity = collections.namedtuple('RangeEquity', 'wins ties equities deals exact')
 INITIAL_BET = 10    # Initial bet value
 TEST_CASES_FILE = 'test_results.txt'
+VERDICT_CACHE_FILE = '.verdict_cache.json'
+EVALUATOR_VERSION = 1   # Change it whenever ranking changes, so cached verdicts are judged again
+HAND_MEMO_SIZE = 1 << 17    # Most hands a HandMemo keeps
+RESULT_FORMATS = ('jsonl', 'junit')
+RESULT_SINK_BATCH = 64      # Number of case results buffered before one write
+RESULT_SINK_INTERVAL = 1.0  # Most seconds a case result is buffered
+RESULT_JUNIT_COUNT = '{:010d}'  # Counts of the JUnit test suite have a fixed width, so they are filled in on close
+GENERATE_CHUNK = 1000   # Number of cases a worker generates in one task
+TUNE_SEARCHES = ('grid', 'random', 'evolve')
+TUNE_MATCHES = 200      # Number of matches every candidate table is scored with
+TUNE_TRAIN = 300        # Number of deals bots of tuner matches are trained with
+TUNE_CANDIDATES = 24    # Number of candidate tables of random search, and of every generation of evolve search
+TUNE_GENERATIONS = 5
 
 ACTION_FOLD = 'Fold'
 ACTION_ALL_IN = 'All_In'
 ACTION_BET = 'Bet'
 
 NUMBER_OF_TRAIN = 3000
+RANK_NAMES = ('Royal Flush', 'Straight Flush', 'Four of a kind', 'Full house', 'Flush', 'Strainght',
+    'Three of a kind', 'Two pairs', 'Pairs', 'Highcard')
+
+SAMPLING_UNIFORM = 'uniform'        # Plain random deals
+SAMPLING_STRATIFIED = 'stratified'  # Latin hypercube of the board cards to come and the hole cards of every player
+SAMPLING_QUASI = 'quasi'            # Randomly shifted Halton sequence of the same deals
+SAMPLINGS = (SAMPLING_UNIFORM, SAMPLING_STRATIFIED, SAMPLING_QUASI)
+STRATA_MATCHES = 2      # Deals are stratified by how many hole cards pair a board card to come, this many or more
+RANGE_TIGHTNESS = 4.0    # How much an all in bet raises the weight of strong starting cards, as exponent
+HALTON_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97)
+
+MAX_OPPONENTS = 9
+FLOP_TABLE_MAGIC = b'TXFL'
+FLOP_TABLE_VERSION = 1
+FLOP_TABLE_HEADER = struct.Struct('<4sHHI')    # magic, version, max opponents, samples per entry
+FLOP_TABLE_SAMPLES = 300
+FLOP_TABLE_SCALE = 65534    # Equity is stored as an integer in 0..FLOP_TABLE_SCALE
+FLOP_TABLE_EMPTY = 0xFFFF
+
+POLICY_MAGIC = b'TXPL'
+POLICY_VERSION = 2
+POLICY_HEADER = struct.Struct('<4sHHHH')    # magic, version, number of buckets, max opponents, max bets
+POLICY_BUCKETS = 130        # Rank * 13 + highest rank value - 2
+POLICY_MAX_BETS = INITIAL_BET + 1   # Limp bets and stacks above it are looked up as it
+POLICY_SAMPLES = 200000     # Number of deals of every round and number of opponents
+POLICY_FOLD = 255
+POLICY_LIMP = 254           # Follow limp bets
+SHARED_CACHE_MAGIC = b'TXSC'
+SHARED_CACHE_VERSION = 2
+SHARED_CACHE_HEADER = struct.Struct('<4sHHHII')    # magic, version, evaluator version, max probes, rank slots, equity slots
+SHARED_RANK_ENTRY = struct.Struct('<QII')           # hand as card bits, packed rank, check of the hand
+SHARED_EQUITY_ENTRY = struct.Struct('<QQffII')      # hero and opponents, community cards, ratio, stderr, samples, check
+SHARED_RANK_SLOTS = 1 << 22     # 64 MB of rank entries, the file is sparse until they are used
+SHARED_EQUITY_SLOTS = 1 << 16
+SHARED_CACHE_PROBES = 32        # Most slots looked at for a key, a full neighborhood is not added to
+HAND_HISTORY_BATCH = 256    # Number of hand records buffered before one write
+RANGE_VALUES = '23456789TJQKA'
+OUTCOME_COLUMNS = (     # Name and array typecode of every column of the outcome store
+    ('match', 'I'), ('seat', 'B'), ('players', 'B'), ('hole1', 'B'), ('hole2', 'B'), ('hand_class', 'B'),
+    ('board1', 'B'), ('board2', 'B'), ('board3', 'B'), ('board4', 'B'), ('board5', 'B'),
+    ('rank', 'B'), ('folded', 'B'), ('won', 'B'), ('bets', 'H'), ('payout', 'h'))
+OUTCOME_CHUNK = 1 << 16     # Number of rows buffered before they are appended to the column files
+OUTCOME_NONE = 255          # Card or rank which was not dealt or not ranked
+OUTCOME_OPERATORS = ('<=', '>=', '!=', '=', '<', '>')
+AUTOTUNE_FILE = '.evaluator_autotune.json'
+AUTOTUNE_HANDS = 3000       # Number of hands every rank backend is timed with
+AUTOTUNE_SAMPLES = 2000     # Number of deals of every equity timed
+AUTOTUNE_SPOTS = 4          # Number of equities every equity backend is timed with
+AUTOTUNE_REPEATS = 3        # Timings of every backend, the best one counts
+RANGE_SAMPLES = 20000       # Number of random deals when a spot is too large to enumerate
+RANGE_ENUM_LIMIT = 50000    # Most deals a spot is enumerated with
+RANGE_CHUNK = 2500          # Number of random deals of a worker task
+RANGE_DEAL_TRIES = 1000     # Most tries to deal hands of all ranges without sharing a card
 
 SUCC_RATIO_ACTION_TABLE = [
     (0.4, ACTION_FOLD, 0, 0),
@@ -27,6 +110,20 @@ SUCC_RATIO_ACTION_TABLE = [
 
 TEST_MODE = True
 
+LOG_DEBUG = 10
+LOG_INFO = 20
+LOG_WARNING = 30
+LOG_OFF = 100
+LOG_LEVELS = {'debug': LOG_DEBUG, 'info': LOG_INFO, 'warning': LOG_WARNING, 'off': LOG_OFF}
+
+CHECKPOINT_INTERVAL = 5.0   # Seconds between checkpoints of long runs
+SIMULATION_REPORT = 100     # Number of matches between progress lines of simulation mode
+COORDINATOR_CHUNK = 100     # Number of matches or test cases of a chunk handed to a worker
+COORDINATOR_TIMEOUT = 600.0     # Seconds a worker may take for a chunk before it is handed to another worker
+WORKER_CONNECT_TRIES = 30   # Tries of a worker to connect, one per second, while the coordinator starts
+METRICS_INTERVAL = 5.0      # Seconds between writes of the metrics file
+METRICS_BUCKETS = (0.0001, 0.001, 0.01, 0.1, 1.0, 10.0)     # Upper bounds in seconds of latency histograms
+
 """
 The "round" input actually means the "game" in this program. Each game has two rounds.
 Each player has 2 given cards and 3 community cards in the first round, and they bet. Then 2 community cards are given.
@@ -40,6 +137,233 @@ CARD_FONT = ('Ariel', 18, 'bold')
 BUTTON_FONT = ('Ariel', 12, 'bold')
 SPINBOX_FONT = ('Ariel', 16, 'bold')
 BETS_FONT = ('Ariel', 20, 'bold')
+EQUITY_FONT = ('Ariel', 12, 'bold')
+EQUITY_CHUNK = 200      # Number of deals of every chunk of live equity
+EQUITY_TARGET = 6000    # Number of deals live equity stops refining at
+EQUITY_POLL_MS = 100    # Interval the window polls live equity
+SPECTATOR_FPS = 20      # Most frames per second spectator mode draws
+DEADLINE_FIRST_DEALS = 16   # Number of deals every bot gets before the budget goes to the least certain bot
+DEADLINE_CHUNK = 64         # Most deals of one step of the scheduler
+DEADLINE_CONFIDENCE = 3.0   # Standard errors from every action boundary at which a bot needs no more deals
+
+
+class EventLogger:
+    '''This class writes game events through a background queue, so the game loop never waits for the terminal.
+    Messages are formatted by the writer thread, and an event below the level costs only one comparison.
+
+    Attributes:
+        level: Events below this level are dropped
+        json_format: Write events as JSON lines instead of plain text
+        queue: Events waiting to be written, as (level, event, message, args)
+    '''
+    def __init__(self, level: int = LOG_INFO, json_format: bool = False):
+        self.level = level
+        self.json_format = json_format
+        self.queue = queue.Queue()
+        self.thread: threading.Thread = None
+
+
+    def is_enabled(self, level: int) -> bool:
+        return level >= self.level
+
+
+    def log(self, level: int, event: str, message: str, *args) -> None:
+        if level < self.level:
+            return
+
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+            atexit.register(self.flush)
+
+        self.queue.put((level, event, message, args))
+
+
+    def debug(self, event: str, message: str, *args) -> None:
+        if LOG_DEBUG >= self.level:
+            self.log(LOG_DEBUG, event, message, *args)
+
+
+    def info(self, event: str, message: str, *args) -> None:
+        if LOG_INFO >= self.level:
+            self.log(LOG_INFO, event, message, *args)
+
+
+    def warning(self, event: str, message: str, *args) -> None:
+        if LOG_WARNING >= self.level:
+            self.log(LOG_WARNING, event, message, *args)
+
+
+    # Wait until every queued event is written, e.g. before asking for input.
+    def flush(self) -> None:
+        if self.thread is not None:
+            self.queue.join()
+
+
+    def run(self) -> None:
+        while True:
+            items = [self.queue.get()]
+            while not self.queue.empty():
+                items.append(self.queue.get_nowait())
+
+            try:
+                lines = []
+                for level, event, message, args in items:
+                    try:
+                        text = message.format(*args)
+                    except Exception:   # A bad message is written raw, so the writer thread never dies
+                        text = '{} {!r}'.format(message, args)
+                    if self.json_format:
+                        level_name = [name for name, value in LOG_LEVELS.items() if value == level][0]
+                        text = json.dumps({'level': level_name, 'event': event, 'message': text, 'args': args}, default=str)
+                    lines.append(text + '\n')
+
+                sys.stdout.write(''.join(lines))
+                sys.stdout.flush()
+            except Exception:    # Output is closed or an event can't be written, events are dropped
+                pass
+            finally:    # Every event is marked done, so flush never hangs
+                for i in range(len(items)):
+                    self.queue.task_done()
+
+
+LOGGER = EventLogger(LOG_DEBUG if TEST_MODE else LOG_INFO)
+
+
+class Metrics:
+    '''This class keeps cumulative counters and latency histograms of a run, and exposes them on a local HTTP
+    endpoint or in a periodically written file. Hot loops only add to a counter; everything else is done when
+    metrics are read. Only the main process is counted, worker processes of pools are not.
+
+    Attributes:
+        counters: Cumulative counts by name, like hands, samples and cases
+        histograms: Counts of every latency bucket, the last one above all bounds, and total seconds by phase
+        start_time: Time metrics started
+    '''
+    def __init__(self):
+        self.counters = collections.Counter()
+        self.histograms: dict[str, list] = {}
+        self.start_time = time.time()
+        self.server = None
+
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] += value
+
+
+    def observe(self, phase: str, seconds: float) -> None:
+        histogram = self.histograms.get(phase)
+        if histogram is None:
+            histogram = self.histograms[phase] = [[0] * (len(METRICS_BUCKETS) + 1), 0.0]
+
+        i = 0
+        while i < len(METRICS_BUCKETS) and seconds > METRICS_BUCKETS[i]:
+            i += 1
+        histogram[0][i] += 1
+        histogram[1] += seconds
+
+
+    @staticmethod
+    def hit_rate(hits: int, misses: int) -> float:
+        if hits + misses == 0:
+            return 0.0
+        return hits / (hits + misses)
+
+
+    def snapshot(self) -> dict:
+        uptime = max(time.time() - self.start_time, 1e-9)
+        counters = dict(self.counters)
+        latency = {}
+        for phase, (buckets, seconds) in list(self.histograms.items()):
+            bounds = [str(bound) for bound in METRICS_BUCKETS] + ['+Inf']
+            latency[phase] = {'count': sum(buckets), 'seconds': seconds, 'buckets': dict(zip(bounds, buckets))}
+
+        return {
+            'uptime': uptime,
+            'counters': counters,
+            'rates': {
+                'hands_per_second': counters.get('hands', 0) / uptime,
+                'samples_per_second': counters.get('samples', 0) / uptime,
+                'cases_per_second': counters.get('cases', 0) / uptime,
+            },
+            'cache_hit_rates': {
+                'verdict_cache': Metrics.hit_rate(counters.get('verdict_hits', 0), counters.get('verdict_misses', 0)),
+                'hand_memo': Metrics.hit_rate(counters.get('memo_hits', 0), counters.get('memo_misses', 0)),
+                'shared_cache': Metrics.hit_rate(counters.get('shared_hits', 0), counters.get('shared_misses', 0)),
+            },
+            'latency': latency,
+        }
+
+
+    # Metrics in the Prometheus text format.
+    def prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = ['texas_uptime_seconds {:.3f}'.format(snapshot['uptime'])]
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append('texas_{}_total {}'.format(name, value))
+        for name, value in sorted(snapshot['rates'].items()):
+            lines.append('texas_{} {:.3f}'.format(name, value))
+        for name, value in sorted(snapshot['cache_hit_rates'].items()):
+            lines.append('texas_{}_hit_rate {:.4f}'.format(name, value))
+        for phase, histogram in sorted(snapshot['latency'].items()):
+            total = 0
+            for bound, count in histogram['buckets'].items():
+                total += count
+                lines.append('texas_{}_seconds_bucket{{le="{}"}} {}'.format(phase, bound, total))
+            lines.append('texas_{}_seconds_sum {:.6f}'.format(phase, histogram['seconds']))
+            lines.append('texas_{}_seconds_count {}'.format(phase, histogram['count']))
+        return '\n'.join(lines) + '\n'
+
+
+    def serve(self, port: int) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+    def write(self, path: str) -> None:
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=1)
+        os.replace(temp_path, path)
+
+
+    # Write the metrics file every interval on a background thread, and once more at exit.
+    def write_periodically(self, path: str, interval: float = METRICS_INTERVAL) -> None:
+        def run():
+            while True:
+                time.sleep(interval)
+                self.write(path)
+
+        threading.Thread(target=run, daemon=True).start()
+        atexit.register(self.write, path)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    '''This class answers GET /metrics in the Prometheus text format, and GET /metrics.json with a JSON snapshot.
+    '''
+    def do_GET(self) -> None:
+        if self.path == '/metrics':
+            body = METRICS.prometheus().encode()
+            content_type = 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body = json.dumps(METRICS.snapshot()).encode()
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+METRICS = Metrics()
 
 
 class TestCase:
@@ -94,6 +418,27 @@ class TestCases:
         self.cases: list[TestCase] = []
 
     def read_from_directory(self, dir_path: str) -> None:
+        for test_case_file, winner in TestCases.read_results(dir_path):
+            try:
+                self.read_from_file(test_case_file, winner)
+            except:
+                print('There is an error while reading \'{}\'.'.format(test_case_file))
+
+        if len(self.cases) == 0:
+            raise
+
+
+    def read_from_file(self, test_case_file: str, winner: str) -> None:
+        self.cases.append(TestCases.read_case(test_case_file, winner))
+
+
+    @staticmethod
+    def read_results(dir_path: str):
+        """Change to the test cases directory and read test_results.txt.
+
+        Returns:
+            A generator of (test case file, expected winner), the winner is '' if not given.
+        """
         os.chdir(Path(dir_path))
 
         with open(TEST_CASES_FILE, 'r') as f:
@@ -106,16 +451,11 @@ class TestCases:
                 else:
                     winner = row[1]
 
-                try:
-                    self.read_from_file(test_case_file, winner)
-                except:
-                    print('There is an error while reading \'{}\'.'.format(test_case_file))
-
-        if len(self.cases) == 0:
-            raise
+                yield test_case_file, winner
 
 
-    def read_from_file(self, test_case_file: str, winner: str) -> None:
+    @staticmethod
+    def read_case(test_case_file: str, winner: str) -> TestCase:
         with open(test_case_file, 'r') as f:
             case = TestCase()
             case.set_name(test_case_file)
@@ -129,10 +469,10 @@ class TestCases:
                 if row[0] == winner:
                     case.set_winner(winner)
 
-            if not case.winner or len(case.players) == 0:
+            if (winner and not case.winner) or len(case.players) == 0:    # No expected winner means the case is tied
                 raise ValueError
 
-            self.cases.append(case)
+            return case
 
 
     def add(self, case: TestCase):
@@ -141,6 +481,229 @@ class TestCases:
         self.cases.append(case)
 
 
+class VerdictCache:
+    '''This class keeps judged results of test cases on disk, so a later file mode run only judges new or changed cases.
+    A result is keyed by a hash of the test case file, the expected winner and EVALUATOR_VERSION.
+
+    Attributes:
+        path: Path of the cache file
+        verdicts: Cached winners and results, keyed by hash
+        used: Verdicts used or added in this run, which are the only ones saved
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        self.verdicts: dict[str, list] = {}
+        self.used: dict[str, list] = {}
+
+        try:
+            with open(path, 'r') as f:
+                content = json.load(f)
+            if content.get('version') == EVALUATOR_VERSION:
+                self.verdicts = content['verdicts']
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+
+    @staticmethod
+    def key(test_case_file: str, winner: str) -> str:
+        with open(test_case_file, 'rb') as f:
+            content = f.read()
+
+        digest = hashlib.blake2b(content, digest_size=16)
+        digest.update('\0{}\0{}'.format(winner, EVALUATOR_VERSION).encode())
+        return digest.hexdigest()
+
+
+    def get(self, key: str, name: str, winner: str) -> CaseResult:
+        verdict = self.verdicts.get(key)
+        if verdict is None or len(verdict) < 3:     # Verdicts cached before ranks were kept are judged again
+            return None
+
+        self.used[key] = verdict
+        return CaseResult(name, winner, verdict[0], verdict[1], verdict[2])
+
+
+    def put(self, key: str, result: CaseResult) -> None:
+        self.used[key] = [result.winners, result.passed, result.ranks]
+
+
+    # Write to a temporary file and replace, so an interrupted run never leaves a broken cache.
+    def save(self) -> None:
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'version': EVALUATOR_VERSION, 'verdicts': self.used}, f, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+
+
+class ResultSink:
+    '''This class streams the result of every case judged by file mode to a JSON lines or JUnit XML file, so other
+    tools can follow a run as it goes. Results are buffered and written in batches, and never kept longer than
+    RESULT_SINK_INTERVAL. The counts of the JUnit test suite are written with a fixed width and filled in on close.
+
+    Attributes:
+        path: Path of the result file
+        format: Format of the file, jsonl or junit
+        batch_size: Number of results kept in buffer before writing
+        records: Encoded results waiting to be written
+        tests: Number of results, failures and errors added
+        restored: Whether the file was started or restored, a resumed sink leaves it untouched until then
+    '''
+    def __init__(self, path: str, format: str = None, batch_size: int = RESULT_SINK_BATCH, resume: bool = False):
+        self.path = path
+        self.format = format or ('junit' if path.endswith('.xml') else 'jsonl')
+        self.batch_size = batch_size
+        self.records: list[str] = []
+        self.tests = 0
+        self.failures = 0
+        self.errors = 0
+        self.restored = False
+        self.flush_time = time.monotonic()
+        self.file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT), 'r+')
+        if not resume:      # A resumed sink is kept until it is restored from the checkpoint
+            self.restore(None)
+
+
+    def junit_header(self) -> str:
+        return '<?xml version="1.0" encoding="UTF-8"?>\n<testsuite name="file mode" tests="{}" failures="{}" errors="{}">\n'.format(
+            RESULT_JUNIT_COUNT.format(self.tests), RESULT_JUNIT_COUNT.format(self.failures), RESULT_JUNIT_COUNT.format(self.errors))
+
+
+    def add(self, result: CaseResult, seconds: float) -> None:
+        self.tests += 1
+        if not result.passed:
+            self.failures += 1
+
+        ranks = {id: RANK_NAMES[rank] for id, rank in result.ranks}
+        if self.format == 'jsonl':
+            self.records.append(json.dumps({'name': result.name, 'expected': result.winner, 'winners': result.winners,
+                'tie': len(result.winners) > 1, 'passed': result.passed, 'ranks': ranks, 'seconds': seconds}))
+        else:
+            properties = [('expected', result.winner), ('winners', ','.join(result.winners)), ('tie', str(len(result.winners) > 1).lower())]
+            properties += [('rank.{}'.format(id), rank) for id, rank in ranks.items()]
+            record = '  <testcase classname="file_mode" name={} time="{:.6f}">\n    <properties>\n'.format(quoteattr(result.name), seconds)
+            for name, value in properties:
+                record += '      <property name={} value={}/>\n'.format(quoteattr(name), quoteattr(value))
+            record += '    </properties>\n'
+            if not result.passed:
+                record += '    <failure message={}/>\n'.format(quoteattr(Game.result_message(result)))
+            self.records.append(record + '  </testcase>')
+        self.flush_if_due()
+
+
+    # A case which cannot be read has no verdict, it is an error of the suite rather than a failure.
+    def add_error(self, name: str, winner: str, message: str, seconds: float) -> None:
+        self.tests += 1
+        self.errors += 1
+        if self.format == 'jsonl':
+            self.records.append(json.dumps({'name': name, 'expected': winner, 'error': message, 'seconds': seconds}))
+        else:
+            self.records.append('  <testcase classname="file_mode" name={} time="{:.6f}">\n    <error message={}/>\n  </testcase>'.format(
+                quoteattr(name), seconds, quoteattr(message)))
+        self.flush_if_due()
+
+
+    def flush_if_due(self) -> None:
+        if len(self.records) >= self.batch_size or time.monotonic() - self.flush_time >= RESULT_SINK_INTERVAL:
+            self.flush()
+
+
+    def flush(self) -> None:
+        if len(self.records) > 0:
+            self.file.write('\n'.join(self.records) + '\n')
+            self.records.clear()
+        self.file.flush()
+        self.flush_time = time.monotonic()
+
+
+    # Size and counts of the file with every result written, which a checkpoint restores.
+    def state(self) -> dict:
+        self.flush()
+        return {'size': self.file.tell(), 'tests': self.tests, 'failures': self.failures, 'errors': self.errors}
+
+
+    # Go back to a state, or start an empty file if state is None.
+    def restore(self, state: dict) -> None:
+        self.records.clear()
+        self.restored = True
+        if state is None:
+            self.tests = self.failures = self.errors = 0
+            self.file.seek(0)
+            self.file.truncate(0)
+            if self.format == 'junit':
+                self.file.write(self.junit_header())
+            return
+
+        self.tests, self.failures, self.errors = state['tests'], state['failures'], state['errors']
+        self.file.seek(state['size'])
+        self.file.truncate(state['size'])
+
+
+    # A resumed sink never restored, as when the checkpoint is of another run, keeps the file as it was.
+    def close(self) -> None:
+        if not self.restored:
+            self.file.close()
+            return
+
+        self.flush()
+        if self.format == 'junit':
+            self.file.write('</testsuite>\n')
+            self.file.seek(0)
+            self.file.write(self.junit_header())
+        self.file.close()
+
+
+class Checkpoint:
+    '''This class keeps the progress of a long run in a small JSON file, so an interrupted run can resume where
+    it stopped. Progress is written to a temporary file and replaced, at most once per interval.
+
+    Attributes:
+        path: Path of the checkpoint file
+        run: Parameters of the run, a checkpoint of another run is never resumed
+        resume: Whether to resume from the checkpoint file
+        interval: Least seconds between two writes
+    '''
+    def __init__(self, path: str, run: dict, resume: bool = False, interval: float = CHECKPOINT_INTERVAL):
+        self.path = path
+        self.run = run
+        self.resume = resume
+        self.interval = interval
+        self.last_time = None       # The first check is always due, so a run saves where it started
+
+
+    def load(self) -> dict:
+        """Read the progress to resume from.
+
+        Returns:
+            The saved progress, or None if not resuming or there is no checkpoint.
+        """
+        if not self.resume or not os.path.exists(self.path):
+            return None
+
+        with open(self.path, 'r') as f:
+            content = json.load(f)
+        if content.get('run') != self.run:
+            raise ValueError('checkpoint \'{}\' is of another run'.format(self.path))
+        return content['state']
+
+
+    def is_due(self) -> bool:
+        return self.last_time is None or time.monotonic() - self.last_time >= self.interval
+
+
+    def save(self, state: dict) -> None:
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'run': self.run, 'state': state}, f, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+        self.last_time = time.monotonic()
+
+
+    # Remove the checkpoint of a finished run, so the next run starts over.
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
 class  Deck():
     '''This class stimulates a deck in Texas Hold'em. It can shuffle a deck of cards and deal them to players.
 
@@ -187,6 +750,17 @@ class  Deck():
             self.cards.remove(card)
 
 
+    # Index of card in a deck which is not shuffled, 0 to 51.
+    @staticmethod
+    def card_index(card: Card) -> int:
+        return 'SDCH'.index(card.suit) * 13 + card.value - 1
+
+
+    @staticmethod
+    def index_card(index: int) -> Card:
+        return Card('SDCH'[index // 13], index % 13 + 1)
+
+
 class Player:
     """A simple class to store id and cards of Player.
 
@@ -196,6 +770,7 @@ class Player:
         bet_amount: The amount used to bet
         rank (int): Rank of result.
         rank_values(list): Statistics of rank suits and values
+        number_of_opponents: Number of players still in the match besides this player, set by Game when training
     """ 
 
     def __init__(self, id: str) -> None:
@@ -209,6 +784,8 @@ class Player:
         self.rank_values: list[int] = []
         self.number_of_train = 0
         self.number_of_train_win = 0
+        self.train_stderr = 0.0
+        self.number_of_opponents = 0
         self.reset_cards()
 
 
@@ -247,6 +824,7 @@ class Player:
         self.community_cards = community_cards
         self.number_of_train = 0
         self.number_of_train_win = 0
+        self.train_stderr = 0.0
 
 
     def reset_cards(self):
@@ -256,6 +834,7 @@ class Player:
         self.rank_values.clear()
         self.number_of_train = 0
         self.number_of_train_win = 0
+        self.train_stderr = 0.0
         self.bets = 0
 
         if self.bet_amount == 0:
@@ -295,9 +874,21 @@ class Player:
     # Check rank of list of cards
     def check_rank(self) -> None:
         if self.rank == 9 and len(self.rank_values) == 0:
-            self.check_suit_rank()
-            self.check_straight()
-            self.check_value_rank()
+            if SHARED_CACHE is not None:
+                SHARED_CACHE.rank(self)
+            else:
+                self.rank_cards()
+
+
+    def rank_cards(self) -> None:
+        METRICS.counters['hands'] += 1
+        if Evaluators.rank_hand is not None:
+            self.rank, self.rank_values = Evaluators.rank_hand(self.initial_cards + self.community_cards)
+            return
+
+        self.check_suit_rank()
+        self.check_straight()
+        self.check_value_rank()
 
 
     # Separate cards into value lists.
@@ -491,10 +1082,28 @@ class Player:
         else:
             return 0
 
+    # Key of rank which orders hands the same way as compare, the better hand has the greater key.
+    def rank_key(self) -> tuple:
+        if self.rank == 0:
+            return (9, ())
+        return (9 - self.rank, tuple(self.rank_values))
+
+
+    @staticmethod
+    def evaluate(cards: list[Card]) -> tuple:
+        """Rank a list of cards with check_rank.
+
+        Returns:
+            The rank key of the cards.
+        """
+        player = Player('')
+        player.set_initial_cards(list(cards))
+        player.check_rank()
+        return player.rank_key()
+
+
     def rank_str(self) -> str:
-        RANK = ('Royal Flush', 'Straight Flush', 'Four of a kind', 'Full house', 'Flush', 'Strainght', 
-        'Three of a kind', 'Two pairs', 'Pairs', 'Highcard')
-        return RANK[self.rank]
+        return RANK_NAMES[self.rank]
 
 
 class HumanPlayer(Player):
@@ -508,11 +1117,12 @@ class HumanPlayer(Player):
             self.check_rank()
 
         bets = 0
+        LOGGER.flush()
         while True:
             input_str = input("Please enter amount to bet (Enter 'f' for fold):")
             if input_str == 'f' or input_str == 'F':    # Justify whether the user is going to fold
                 self.state = ACTION_FOLD
-                print("Human Player: fold.")
+                LOGGER.info('human_action', "Human Player: fold.")
                 return ACTION_FOLD, 0            
             elif input_str.isdigit():
                 bets = int(input_str)
@@ -522,16 +1132,23 @@ class HumanPlayer(Player):
 
         self.take_bets(bets)
         if self.is_all_in():
-            print("Human Player: bet ${}. It\'s all in.".format(self.bets))
+            LOGGER.info('human_action', "Human Player: bet ${}. It\'s all in.", self.bets)
         else:
-            print("Human Player: bet ${}.".format(bets))
+            LOGGER.info('human_action', "Human Player: bet ${}.", bets)
 
         return ACTION_BET, bets
 
 
 class BotPlayer(Player):
     '''This class represents bot players in user mode.  And it's a subclass of class Player.
+
+    Attributes:
+        action_table: Table of win ratio grades and bet amounts, SUCC_RATIO_ACTION_TABLE unless a tuned table is loaded
     '''
+    action_table: list[tuple] = SUCC_RATIO_ACTION_TABLE
+    policy_path: str = None         # Policy file bots decide with instead of training, loaded at first use
+    policy: 'PolicyTable' = None
+
     def make_action(self, limp_bets: int) -> tuple[str, int]:
         if not self.is_betting():
             return self.state, 0
@@ -541,39 +1158,142 @@ class BotPlayer(Player):
         if len(self.initial_cards) + len(self.community_cards) >= 5:
             self.check_rank()
 
-            succ_ratio = self.number_of_train_win / self.number_of_train
-            print("Bot Player {}: train {}, win {}, ratio {}.".format(self.id, self.number_of_train, self.number_of_train_win, succ_ratio))
-
-            for action_item in SUCC_RATIO_ACTION_TABLE:
-                if succ_ratio < action_item[0]:
-                    if action_item[1] == ACTION_FOLD:
-                        self.state = ACTION_FOLD
-                        print("Bot Player {}: fold.".format(self.id))
-                        return ACTION_FOLD, 0
-
-                    if limp_bets < action_item[2]:
-                        bets = action_item[2]
-                    elif limp_bets > action_item[3]:
-                        self.state = ACTION_FOLD
-                        print("Bot Player {}: fold.".format(self.id))
-                        return ACTION_FOLD, 0
-                
-                    break
+            if BotPlayer.load_policy() is not None:
+                action, bets = BotPlayer.policy.lookup(self.initial_cards, self.community_cards, self.number_of_opponents, limp_bets, self.bet_amount)
+            else:
+                succ_ratio = self.number_of_train_win / self.number_of_train
+                LOGGER.debug('bot_train', "Bot Player {}: train {}, win {}, ratio {}.", self.id, self.number_of_train, self.number_of_train_win, succ_ratio)
+                action, bets = self.choose_action(succ_ratio, limp_bets)
+
+            if action == ACTION_FOLD:
+                self.state = ACTION_FOLD
+                LOGGER.info('bot_action', "Bot Player {}: fold.", self.id)
+                return ACTION_FOLD, 0
 
         self.take_bets(bets)
         if self.is_all_in():
-            print("Bot Player {}: bet ${}. It\'s all in.".format(self.id, self.bets))
+            LOGGER.info('bot_action', "Bot Player {}: bet ${}. It\'s all in.", self.id, self.bets)
         else:
-            print("Bot Player {}: bet ${}.".format(self.id, bets))
+            LOGGER.info('bot_action', "Bot Player {}: bet ${}.", self.id, bets)
 
         return ACTION_BET, bets
 
 
+    # Find the grade of win ratio in action table, and bet its floor, follow limp bets up to its ceiling, or fold.
+    def choose_action(self, succ_ratio: float, limp_bets: int) -> tuple[str, int]:
+        for action_item in self.action_table:
+            if succ_ratio < action_item[0]:
+                if action_item[1] == ACTION_FOLD:
+                    return ACTION_FOLD, 0
+
+                if limp_bets < action_item[2]:
+                    return ACTION_BET, action_item[2]
+                elif limp_bets > action_item[3]:
+                    return ACTION_FOLD, 0
+
+                break
+
+        return ACTION_BET, limp_bets
+
+
+    @staticmethod
+    def load_policy() -> 'PolicyTable':
+        if BotPlayer.policy is None and BotPlayer.policy_path is not None:
+            BotPlayer.policy = PolicyTable(BotPlayer.policy_path)
+        return BotPlayer.policy
+
+
+    @staticmethod
+    def load_action_table(path: str) -> list[tuple]:
+        with open(path, 'r') as f:
+            return [tuple(action_item) for action_item in json.load(f)]
+
+
+    @staticmethod
+    def save_action_table(action_table: list[tuple], path: str) -> None:
+        with open(path, 'w') as f:
+            f.write('[\n' + ',\n'.join([' ' + json.dumps(list(action_item)) for action_item in action_table]) + '\n]\n')
+
+
+class HandRange:
+    '''This class represents the weighted hole cards an opponent may hold.
+    The weight of every 2 cards is kept in a table, and the average weight over all 2 cards is 1.
+
+    Attributes:
+        weights: Weight of every 2 cards, keyed by frozenset of the cards
+    '''
+    percentiles: dict[frozenset, float] = {}    # Percentile of starting strength of every 2 cards
+    ranges_by_bets: dict[int, 'HandRange'] = {}
+
+    def __init__(self, weights: dict[frozenset, float]):
+        self.weights = weights
+
+
+    def weight(self, cards: list[Card]) -> float:
+        return self.weights.get(frozenset(cards), 0.0)
+
+
+    @staticmethod
+    def from_bets(bets: int) -> 'HandRange':
+        """Range of a player who has bet the amount in this match. The more the bets, the stronger the cards.
+
+        Returns:
+            A range, shared by all players who have bet the same amount.
+        """
+        hand_range = HandRange.ranges_by_bets.get(bets)
+        if hand_range is None:
+            percentiles = HandRange.starting_percentiles()
+            tightness = RANGE_TIGHTNESS * min(bets, INITIAL_BET) / INITIAL_BET
+            weights = {cards: math.exp(tightness * (percentile - 0.5)) for cards, percentile in percentiles.items()}
+
+            mean = sum(weights.values()) / len(weights)
+            hand_range = HandRange({cards: weight / mean for cards, weight in weights.items()})
+            HandRange.ranges_by_bets[bets] = hand_range
+
+        return hand_range
+
+
+    @staticmethod
+    def starting_percentiles() -> dict[frozenset, float]:
+        if len(HandRange.percentiles) == 0:
+            deck = Deck()
+            all_cards = list(itertools.combinations(deck.cards, 2))
+            all_cards.sort(key=lambda cards: HandRange.starting_strength(cards))
+            for i, cards in enumerate(all_cards):
+                HandRange.percentiles[frozenset(cards)] = i / (len(all_cards) - 1)
+
+        return HandRange.percentiles
+
+
+    # Score of 2 starting cards in the way of Chen formula.
+    @staticmethod
+    def starting_strength(cards: list[Card]) -> float:
+        values = sorted([14 if card.value == 1 else card.value for card in cards], reverse=True)
+        points = {14: 10, 13: 8, 12: 7, 11: 6}
+
+        score = points.get(values[0], values[0] / 2)
+        if values[0] == values[1]:
+            return max(5, score * 2)
+
+        if cards[0].suit == cards[1].suit:
+            score += 2
+
+        gap = values[0] - values[1] - 1
+        score -= (0, 1, 2, 4)[gap] if gap < 4 else 5
+        if gap <= 1 and values[0] < 12:
+            score += 1
+
+        return score
+
+
 class Trainer:
     '''This class trains bot players so they stimulate card process and estimate their winning probability.
     
     Attributes:
-        number_of_player: The number of players in game.'''
+        number_of_player: The number of players in game.
+        match_cache: Probabilities of strata of stratified and quasi sampling, by the values of the cards left'''
+    match_cache: dict[tuple, list] = {}
+
     def __init__(self, number_of_player: int):
         self.players: list[Player] = []
         for i in range(number_of_player):
@@ -607,87 +1327,2082 @@ class Trainer:
         return winner
 
 
-class Game():
-    '''The class represents gaming system for Texas Holdem.
-    
-    Attributes:
-        deck: Stimulated deck for game
-        bet_pool: Total amount bet in bet pool for this game
-        number_of_round: Number of rounds passed
-        community_cards: Community card ist for this round
-        human_player: object for HumanPlayer class
-        bot_player: List of objects for BotPlayer class.
-        all_players:List of objects for all Players.
-        '''
-    def __init__(self):
-        self.deck = Deck()
-        self.bet_pool = 0
-        self.number_of_round = 0
-        self.community_cards: list[Card] = []
-        self.human_player = HumanPlayer('0')
-        self.bot_players: list[BotPlayer] = []
-        self.all_players: list[Player] = []
+    def estimate(self, hero_cards: list[Card], community_cards: list[Card], number_of_samples: int = NUMBER_OF_TRAIN, sampling: str = SAMPLING_UNIFORM, ranges: list = None) -> Equity:
+        """Estimate the probability that hero cards win the showdown against the trainer's players.
+        Every deal completes the community cards and gives 2 cards to each trainer's player.
+        Hands are ranked once per estimate, a hand dealt again is looked up instead.
 
+        With ranges, the i-th trainer's player holds cards of ranges[i] (None for random cards).
+        Deals are still drawn uniformly and weighted by the ranges (importance sampling), so no deal is wasted.
 
-    def init_players(self, number_of_players: int) -> None:
-        self.human_player.set_initial_bet(INITIAL_BET)
+        Returns:
+            Equity of win ratio, its standard error, the number of deals and the number of evaluated hands.
+        """
+        # Only equities against random cards are kept in the shared cache, since ranges change with the bets.
+        if SHARED_CACHE is None or (ranges is not None and any(hand_range is not None for hand_range in ranges)):
+            return self.estimate_deals(hero_cards, community_cards, number_of_samples, sampling, ranges)
 
-        for i in range(1, number_of_players + 1):
-            player = BotPlayer(str(i))
-            player.set_initial_bet(INITIAL_BET)
-            self.bot_players.append(player)
+        equity = SHARED_CACHE.equity(hero_cards, community_cards, len(self.players), sampling, number_of_samples)
+        if equity is None:
+            equity = self.estimate_deals(hero_cards, community_cards, number_of_samples, sampling, ranges)
+            SHARED_CACHE.add_equity(hero_cards, community_cards, len(self.players), sampling, equity)
+        return equity
 
-        self.all_players.append(self.human_player)
-        self.all_players += self.bot_players
 
+    def estimate_deals(self, hero_cards: list[Card], community_cards: list[Card], number_of_samples: int, sampling: str, ranges: list) -> Equity:
+        if sampling == SAMPLING_UNIFORM and Evaluators.estimate_equity is not None and (ranges is None or all(hand_range is None for hand_range in ranges)):
+            return Evaluators.estimate_equity(hero_cards, community_cards, len(self.players), number_of_samples)
 
-    def clear_players(self) -> None:
-        self.bot_players.clear()
-        self.all_players.clear()
-        
+        deck = Deck()
+        deck.remove(hero_cards + community_cards)
+        keys: dict[frozenset, tuple] = {}
 
-    def reset_cards(self):
-        self.bet_pool = 0
-        self.number_of_round = 0
-        self.community_cards.clear()
+        if sampling == SAMPLING_STRATIFIED or sampling == SAMPLING_QUASI:
+            dimension = (1 if len(community_cards) < 5 else 0) + len(self.players)
+            if sampling == SAMPLING_STRATIFIED:
+                points = Trainer.latin_points(dimension, number_of_samples)
+            else:
+                points = Trainer.halton_points(dimension, number_of_samples)
+            return self.estimate_points(hero_cards, community_cards, deck.cards, points, keys, ranges)
 
-        for player in self.all_players:
-            player.reset_cards()
+        dimension = 5 - len(community_cards) + 2 * len(self.players)
 
+        sums = [0.0] * 4
+        for i in range(number_of_samples):
+            point = [random.random() for d in range(dimension)]
+            Trainer.add_deal(sums, *Trainer.play_deal(hero_cards, community_cards, deck.cards, point, keys, ranges))
 
-    def deal_cards(self) -> None:
-        if self.number_of_round == 0:
-            self.deck.shuffle()
-            self.community_cards.clear()
+        ratio, variance = Trainer.weighted_mean(sums)
+        METRICS.count('samples', number_of_samples)
+        return Equity(ratio, math.sqrt(variance), number_of_samples, len(keys))
 
-            print('------Initialization--------')
-            for player in self.all_players:
-                player.set_initial_cards(self.deck.deal(2))
 
-            Game.print_cards('Human Player: ', self.human_player.initial_cards)
-        elif self.number_of_round == 1:
-            print('---------Round 1-----------')
-            self.community_cards += self.deck.deal(3)
-            for player in self.all_players:
-                player.set_community_cards(self.community_cards)
+    # Stratified and quasi sampling deal by points with one coordinate for the board cards to come, as one
+    # combination, and one coordinate for the hole cards of every player. Spreading the points evenly over a
+    # coordinate balances which boards and which hole cards are dealt, but not how they go together. What matters
+    # most of that is whether an opponent pairs a board card to come, and the probability of it is known exactly,
+    # so the deals are post-stratified by it.
+    def estimate_points(self, hero_cards: list[Card], community_cards: list[Card], cards: list[Card], points: list[list[float]], keys: dict, ranges: list) -> Equity:
+        number_of_board = 5 - len(community_cards)
+        probabilities = Trainer.match_probabilities(cards, number_of_board, len(self.players))
+        counts = [0] * len(probabilities)
+        sums = [[0.0] * 4 for probability in probabilities]
 
-            Game.print_cards('Community cards: ', self.community_cards)
-        elif self.number_of_round == 2:
-            print('---------Round 2-----------')
-            self.community_cards += self.deck.deal(2)
-            for player in self.all_players:
-                player.set_community_cards(self.community_cards)
+        for point in points:
+            dealt = Trainer.deal_combinations(cards, number_of_board, point)
+            board_values = {card.value for card in dealt[:number_of_board]}
+            matches = min(STRATA_MATCHES, len([card for card in dealt[number_of_board:] if card.value in board_values]))
+            counts[matches] += 1
+            Trainer.add_deal(sums[matches], *Trainer.judge_deal(hero_cards, community_cards, dealt, keys, ranges))
 
-            Game.print_cards('Community cards: ', self.community_cards[3:])
+        ratio, variance = Trainer.stratified_mean(probabilities, counts, sums)
+        METRICS.count('samples', len(points))
+        return Equity(ratio, math.sqrt(variance), len(points), len(keys))
 
 
-    # Run user mode
-    def run_user_mode(self, number_of_players: int) -> None:
-        self.init_players(number_of_players)
-        match_count = 0
-        while True:
-            match_count += 1
-            print('\n------Match {}--------\n'.format(match_count))
+    # Latin hypercube, every coordinate has one point in each of number_of_points equal intervals.
+    @staticmethod
+    def latin_points(dimension: int, number_of_points: int) -> list[list[float]]:
+        columns = [random.sample(range(number_of_points), number_of_points) for d in range(dimension)]
+        return [[(column[i] + random.random()) / number_of_points for column in columns] for i in range(number_of_points)]
+
+
+    @staticmethod
+    def halton_points(dimension: int, number_of_points: int) -> list[list[float]]:
+        shift = [random.random() for d in range(dimension)]
+        return [[(Trainer.radical_inverse(i, HALTON_PRIMES[d]) + shift[d]) % 1.0 for d in range(dimension)] for i in range(1, number_of_points + 1)]
+
+
+    @staticmethod
+    def deal_combinations(cards: list[Card], number_of_board: int, point: list[float]) -> list[Card]:
+        """Deal the board cards to come by the first coordinate of point, and 2 cards for each player by the others.
+        Hole cards which share a card with those dealt before are dealt again at random from the cards left, so
+        they are still uniform among the cards left.
+
+        Returns:
+            The board cards to come and then the hole cards of each player.
+        """
+        coordinates = iter(point)
+        dealt: list[Card] = []
+        if number_of_board > 0:
+            index = int(next(coordinates) * math.comb(len(cards), number_of_board))
+            dealt += Trainer.combination(cards, number_of_board, index)
+
+        for u in coordinates:
+            hole_cards = Trainer.combination(cards, 2, int(u * math.comb(len(cards), 2)))
+            if hole_cards[0] in dealt or hole_cards[1] in dealt:
+                hole_cards = random.sample([card for card in cards if card not in dealt], 2)
+            dealt += hole_cards
+        return dealt
+
+
+    # The combination of size cards at index, in the lexicographic order of all of them.
+    @staticmethod
+    def combination(cards: list[Card], size: int, index: int) -> list[Card]:
+        combination: list[Card] = []
+        for i, card in enumerate(cards):
+            if size == 0:
+                break
+            count = math.comb(len(cards) - i - 1, size - 1)    # Combinations starting with this card
+            if index < count:
+                combination.append(card)
+                size -= 1
+            else:
+                index -= count
+        return combination
+
+
+    # Probability that none, one and so on up to STRATA_MATCHES or more hole cards of the players pair a board
+    # card to come. It only depends on how many cards of each value are left, so it is kept for them.
+    @staticmethod
+    def match_probabilities(cards: list[Card], number_of_board: int, number_of_players: int) -> list[float]:
+        value_counts = collections.Counter(card.value for card in cards)
+        cache_key = (tuple(sorted(value_counts.items())), number_of_board, number_of_players)
+        probabilities = Trainer.match_cache.get(cache_key)
+        if probabilities is not None:
+            return probabilities
+
+        probabilities = [0.0] * (STRATA_MATCHES + 1)
+        number_of_hole = 2 * number_of_players
+        number_of_rest = len(cards) - number_of_board
+        boards = math.comb(len(cards), number_of_board)
+        hole_cards = math.comb(number_of_rest, number_of_hole)
+        for board_values in itertools.combinations_with_replacement(sorted(value_counts), number_of_board):
+            board_counts = collections.Counter(board_values)
+            ways = math.prod(math.comb(value_counts[value], count) for value, count in board_counts.items())
+            if ways == 0:
+                continue
+            pairing = sum(value_counts[value] - count for value, count in board_counts.items())     # Cards left of the board values
+            for matches in range(STRATA_MATCHES):
+                probabilities[matches] += ways / boards * math.comb(pairing, matches) * math.comb(number_of_rest - pairing, number_of_hole - matches) / hole_cards
+        probabilities[STRATA_MATCHES] = max(0.0, 1.0 - sum(probabilities[:STRATA_MATCHES]))
+
+        Trainer.match_cache[cache_key] = probabilities
+        return probabilities
+
+
+    # Add a deal to the sums of weight, weight * win, weight^2 and weight^2 * win.
+    @staticmethod
+    def add_deal(sums: list[float], win: int, weight: float) -> None:
+        sums[0] += weight
+        sums[1] += weight * win
+        sums[2] += weight * weight
+        sums[3] += weight * weight * win
+
+
+    @staticmethod
+    def stratified_mean(probabilities: list[float], counts: list[int], sums: list[list[float]]) -> tuple[float, float]:
+        """Self-normalized mean of weighted wins over strata of known probabilities, and its variance by the delta method.
+        Strata without a deal are left out, which scales up the others. The variance within a stratum is measured
+        with n - 1, and a stratum of a single deal takes the variance pooled over the others.
+
+        Returns:
+            The mean and the variance of the mean.
+        """
+        strata = [s for s in range(len(counts)) if counts[s] > 0]
+        weight = sum([probabilities[s] * sums[s][0] / counts[s] for s in strata])
+        if weight == 0:
+            return 0.0, 0.0
+        ratio = sum([probabilities[s] * sums[s][1] / counts[s] for s in strata]) / weight
+
+        # A deal adds weight * (win - ratio) to the error of the ratio, its variance is taken within every stratum.
+        variances: dict[int, float] = {}
+        pooled = 0.0
+        for s in strata:
+            if counts[s] > 1:
+                total = sums[s][1] - ratio * sums[s][0]
+                squares = sums[s][3] * (1 - 2 * ratio) + ratio * ratio * sums[s][2]
+                variances[s] = max(0.0, squares - total * total / counts[s]) / (counts[s] - 1)
+                pooled += variances[s] * (counts[s] - 1)
+        pooled /= max(1, sum([counts[s] - 1 for s in strata]))
+
+        variance = sum([probabilities[s] ** 2 * variances.get(s, pooled) / counts[s] for s in strata]) / (weight * weight)
+        return ratio, variance
+
+
+    @staticmethod
+    def weighted_mean(sums: list[float]) -> tuple[float, float]:
+        """Self-normalized mean of weighted wins and its variance by the delta method.
+        With every weight 1, they are the plain ratio and ratio * (1 - ratio) / number of deals.
+
+        Returns:
+            The mean and the variance of the mean.
+        """
+        if sums[0] == 0:
+            return 0.0, 0.0
+
+        ratio = sums[1] / sums[0]
+        variance = (sums[3] * (1 - 2 * ratio) + ratio * ratio * sums[2]) / (sums[0] * sums[0])
+        return ratio, max(0.0, variance)
+
+
+    # Merge estimates of the same equity from independent deals.
+    @staticmethod
+    def merge_equity(equity1: Equity, equity2: Equity) -> Equity:
+        if equity1 is None:
+            return equity2
+
+        samples = equity1.samples + equity2.samples
+        ratio = (equity1.ratio * equity1.samples + equity2.ratio * equity2.samples) / samples
+        variance = ((equity1.stderr * equity1.samples) ** 2 + (equity2.stderr * equity2.samples) ** 2) / samples ** 2
+        return Equity(ratio, math.sqrt(variance), samples, equity1.evaluations + equity2.evaluations)
+
+
+    @staticmethod
+    def radical_inverse(index: int, base: int) -> float:
+        result = 0.0
+        fraction = 1.0 / base
+        while index > 0:
+            result += (index % base) * fraction
+            index //= base
+            fraction /= base
+        return result
+
+
+    @staticmethod
+    def play_deal(hero_cards: list[Card], community_cards: list[Card], cards: list[Card], point: list[float], keys: dict, ranges: list = None) -> tuple[int, float]:
+        """Deal one card for every coordinate of point from the remaining cards, the board first and then 2 cards for each player.
+
+        Returns:
+            1 if hero cards win or tie the deal, otherwise 0, and the weight of the deal under ranges.
+        """
+        cards = list(cards)
+        dealt: list[Card] = []
+        for u in point:
+            i = int(u * len(cards))
+            cards[i], cards[-1] = cards[-1], cards[i]
+            dealt.append(cards.pop())
+        return Trainer.judge_deal(hero_cards, community_cards, dealt, keys, ranges)
+
+
+    @staticmethod
+    def judge_deal(hero_cards: list[Card], community_cards: list[Card], dealt: list[Card], keys: dict, ranges: list = None) -> tuple[int, float]:
+        """Judge dealt cards, the board cards to come first and then 2 cards for each player.
+
+        Returns:
+            1 if hero cards win or tie the deal, otherwise 0, and the weight of the deal under ranges.
+        """
+        number_of_board = 5 - len(community_cards)
+        board = community_cards + dealt[:number_of_board]
+
+        weight = 1.0
+        if ranges is not None:
+            for i, hand_range in enumerate(ranges):
+                if hand_range is not None:
+                    j = number_of_board + 2 * i
+                    weight *= hand_range.weight(dealt[j:j + 2])
+
+        hero_key = Trainer.lookup_key(hero_cards + board, keys)
+        for i in range(number_of_board, len(dealt), 2):
+            if Trainer.lookup_key(dealt[i:i + 2] + board, keys) > hero_key:
+                return 0, weight
+        return 1, weight
+
+
+    @staticmethod
+    def lookup_key(cards: list[Card], keys: dict) -> tuple:
+        hand = frozenset(cards)
+        key = keys.get(hand)
+        if key is None:
+            key = Player.evaluate(cards)
+            keys[hand] = key
+        return key
+
+
+class DrawCalculator:
+    '''This class counts exactly how often hole cards finish in each rank by the river, and lists the outs,
+    by going through every runout of the remaining deck instead of sampling deals.
+
+    Attributes:
+        hole_cards: The 2 cards of the player
+        community_cards: The 3 to 5 community cards dealt so far
+        remaining_cards: Cards not dealt yet
+    '''
+    def __init__(self, hole_cards: list[Card], community_cards: list[Card]):
+        if len(hole_cards) != 2 or not 3 <= len(community_cards) <= 5:
+            raise ValueError('need 2 hole cards and 3 to 5 community cards')
+
+        dealt = set(hole_cards + community_cards)
+        if len(dealt) != len(hole_cards) + len(community_cards):
+            raise ValueError('cards are dealt twice')
+
+        self.hole_cards = hole_cards
+        self.community_cards = community_cards
+        self.remaining_cards = [card for card in Deck().cards if card not in dealt]
+        if len(self.remaining_cards) + len(dealt) != 52:
+            raise ValueError('cards are not in the deck')
+
+
+    # Rank of the best hand of hole cards and the given community cards.
+    def rank(self, community_cards: list[Card]) -> int:
+        player = Player('')
+        player.set_initial_cards(list(self.hole_cards))
+        player.set_community_cards(community_cards)
+        player.check_rank()
+        return player.rank
+
+
+    def count_ranks(self) -> tuple[list[int], int]:
+        """Count the runouts finishing in each rank.
+
+        Returns:
+            Number of runouts of every rank, indexed as RANK_NAMES, and the number of all runouts.
+        """
+        counts = [0] * len(RANK_NAMES)
+        total = 0
+        for runout in itertools.combinations(self.remaining_cards, 5 - len(self.community_cards)):
+            counts[self.rank(self.community_cards + list(runout))] += 1
+            total += 1
+        return counts, total
+
+
+    def probabilities(self) -> dict[str, float]:
+        counts, total = self.count_ranks()
+        return {RANK_NAMES[rank]: count / total for rank, count in enumerate(counts) if count > 0}
+
+
+    def outs(self) -> dict[str, list[Card]]:
+        """Find the next cards which make a better rank than the current one.
+
+        Returns:
+            Outs grouped by the rank they make, best rank first.
+        """
+        outs: dict[str, list[Card]] = {}
+        if len(self.community_cards) == 5:
+            return outs
+
+        current_rank = self.rank(self.community_cards)
+        for rank, card in sorted((self.rank(self.community_cards + [card]), card) for card in self.remaining_cards):
+            if rank < current_rank:
+                outs.setdefault(RANK_NAMES[rank], []).append(card)
+        return outs
+
+
+class RangeCalculator:
+    '''This class calculates win and tie equity of players holding hand ranges, with an optional partial board.
+    Spots are enumerated exactly when they have at most RANGE_ENUM_LIMIT deals, otherwise random deals are
+    played in chunks on worker processes. The pool is kept across spots, so a batch starts it only once.
+
+    Attributes:
+        samples: Number of random deals of a spot which is not enumerated
+        seed: Seed of random deals
+        workers: Number of worker processes, default number of cores
+    '''
+    def __init__(self, samples: int = RANGE_SAMPLES, seed: int = 0, workers: int = None):
+        self.samples = samples
+        self.seed = seed
+        self.workers = workers
+        self.pool = None
+        self.spots = 0
+
+
+    @staticmethod
+    def parse_range(range_str: str) -> list[tuple]:
+        """Parse a range like 'QQ+,AKs,KQo,S1H13,random'. Values are 23456789TJQKA, 's' is suited, 'o' is
+        offsuit, '+' raises the lower card up to the higher one, and explicit hole cards use the card format
+        of the hand history.
+
+        Returns:
+            All hole cards of the range, without duplicates.
+        """
+        hands = set()
+        for token in range_str.split(','):
+            token = token.strip()
+            if token.lower() in ('random', '*'):
+                hands.update(itertools.combinations(Deck().cards, 2))
+                continue
+
+            if token[0] in 'SDCH':
+                cards = HandHistory.decode_cards([token[:2 + token[2].isdigit()], token[2 + token[2].isdigit():]])
+                if not all(card in Deck().cards for card in cards) or cards[0] == cards[1]:
+                    raise ValueError('invalid hole cards {}'.format(token))
+                hands.add(tuple(sorted(cards)))
+                continue
+
+            if len(token) < 2 or token[0] not in RANGE_VALUES or token[1] not in RANGE_VALUES:
+                raise ValueError('invalid range {}'.format(token))
+
+            high = RANGE_VALUES.index(token[0])
+            low = RANGE_VALUES.index(token[1])
+            kind = token[2:].rstrip('+')
+            if high < low or kind not in ('', 's', 'o') or (high == low and kind):
+                raise ValueError('invalid range {}'.format(token))
+
+            if token.endswith('+'):
+                pairs = [(value, value) for value in range(low, len(RANGE_VALUES))] if high == low else [(high, value) for value in range(low, high)]
+            else:
+                pairs = [(high, low)]
+
+            for high, low in pairs:
+                for suit1, suit2 in itertools.product('SDCH', repeat=2):
+                    if (kind == 's' and suit1 != suit2) or (kind == 'o' and suit1 == suit2) or (high == low and suit1 >= suit2):
+                        continue
+                    cards = [Card(suit1, (high + 1) % 13 + 1), Card(suit2, (low + 1) % 13 + 1)]
+                    hands.add(tuple(sorted(cards)))
+
+        return sorted(hands)
+
+
+    # Indexes of players with the best hand on a full board.
+    @staticmethod
+    def winners(hands: list[tuple], board: list[Card]) -> list[int]:
+        keys = [Player.evaluate(list(hand) + board) for hand in hands]
+        best = max(keys)
+        return [i for i, key in enumerate(keys) if key == best]
+
+
+    @staticmethod
+    def add_result(winners: list[int], wins: list[float], ties: list[float], equities: list[float]) -> None:
+        for i in winners:
+            if len(winners) == 1:
+                wins[i] += 1
+            else:
+                ties[i] += 1
+            equities[i] += 1 / len(winners)
+
+
+    def calculate(self, range_strs: list[str], board: list[Card] = []) -> RangeEquity:
+        if not 2 <= len(range_strs) <= 10 or len(board) > 5 or len(set(board)) != len(board):
+            raise ValueError('need 2 to 10 ranges and at most 5 board cards')
+
+        ranges = []
+        for range_str in range_strs:
+            hands = [hand for hand in RangeCalculator.parse_range(range_str) if hand[0] not in board and hand[1] not in board]
+            if len(hands) == 0:
+                raise ValueError('range {} is blocked by the board'.format(range_str))
+            ranges.append(hands)
+
+        self.spots += 1
+        remaining = 52 - len(board) - 2 * len(ranges)
+        runouts = math.comb(remaining, 5 - len(board))
+        if math.prod(len(hands) for hands in ranges) * runouts <= RANGE_ENUM_LIMIT:
+            return self.enumerate(ranges, board)
+
+        tasks = []
+        for first_deal in range(0, self.samples, RANGE_CHUNK):
+            tasks.append((ranges, board, '{}-{}-{}'.format(self.seed, self.spots, first_deal), min(RANGE_CHUNK, self.samples - first_deal)))
+
+        if len(tasks) == 1:
+            results = [RangeCalculator.sample_chunk(tasks[0])]
+        else:
+            if self.pool is None:
+                self.pool = multiprocessing.Pool(self.workers, **SharedCache.pool_args())
+            results = self.pool.imap_unordered(RangeCalculator.sample_chunk, tasks)
+
+        total = [[0.0] * len(ranges) for _ in range(3)]
+        for result in results:
+            for counts, chunk_counts in zip(total, result):
+                for i, count in enumerate(chunk_counts):
+                    counts[i] += count
+
+        METRICS.count('samples', self.samples)
+        wins, ties, equities = [[count / self.samples for count in counts] for counts in total]
+        return RangeEquity(wins, ties, equities, self.samples, False)
+
+
+    def enumerate(self, ranges: list[list[tuple]], board: list[Card]) -> RangeEquity:
+        wins = [0.0] * len(ranges)
+        ties = [0.0] * len(ranges)
+        equities = [0.0] * len(ranges)
+        deals = 0
+
+        for hands in itertools.product(*ranges):
+            dealt = set(board)
+            dealt.update(card for hand in hands for card in hand)
+            if len(dealt) != len(board) + 2 * len(hands):
+                continue
+
+            remaining_cards = [card for card in Deck().cards if card not in dealt]
+            for runout in itertools.combinations(remaining_cards, 5 - len(board)):
+                RangeCalculator.add_result(RangeCalculator.winners(hands, board + list(runout)), wins, ties, equities)
+                deals += 1
+
+        if deals == 0:
+            raise ValueError('ranges cannot be dealt together')
+        return RangeEquity([win / deals for win in wins], [tie / deals for tie in ties], [equity / deals for equity in equities], deals, True)
+
+
+    @staticmethod
+    def sample_chunk(task: tuple) -> tuple:
+        """Play random deals of one chunk. Hands are drawn from every range and redrawn when they share cards.
+
+        Returns:
+            Numbers of wins, ties and equity of every player.
+        """
+        ranges, board, seed, number_of_deals = task
+        rng = random.Random(seed)
+        wins = [0.0] * len(ranges)
+        ties = [0.0] * len(ranges)
+        equities = [0.0] * len(ranges)
+        deck = Deck().cards
+
+        for _ in range(number_of_deals):
+            for _ in range(RANGE_DEAL_TRIES):
+                hands = [rng.choice(hands) for hands in ranges]
+                dealt = set(board)
+                dealt.update(card for hand in hands for card in hand)
+                if len(dealt) == len(board) + 2 * len(hands):
+                    break
+            else:
+                raise ValueError('ranges cannot be dealt together')
+
+            runout = rng.sample([card for card in deck if card not in dealt], 5 - len(board))
+            RangeCalculator.add_result(RangeCalculator.winners(hands, board + runout), wins, ties, equities)
+
+        return wins, ties, equities
+
+
+    def run_batch(self, batch_path: str, output_path: str = None) -> None:
+        """Calculate every spot of a batch file, one spot per line: ranges separated by spaces, then an
+        optional '/' and board cards. Empty lines and lines starting with '#' are skipped.
+        """
+        rows = []
+        with open(batch_path, 'r') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if line == '' or line.startswith('#'):
+                    continue
+
+                range_part, _, board_part = line.partition('/')
+                range_strs = range_part.split()
+                try:
+                    board = HandHistory.decode_cards(board_part.replace(',', ' ').split())
+                    result = self.calculate(range_strs, board)
+                except (ValueError, IndexError) as e:
+                    LOGGER.warning('equity', 'Line {}: {}', line_number, e)
+                    continue
+
+                self.print_result(range_strs, result, 'Line {}: '.format(line_number))
+                for i, range_str in enumerate(range_strs):
+                    rows.append([line_number, i, range_str, board_part.strip(), result.wins[i], result.ties[i], result.equities[i], result.deals, result.exact])
+
+        if output_path:
+            with open(output_path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['line', 'player', 'range', 'board', 'win', 'tie', 'equity', 'deals', 'exact'])
+                writer.writerows(rows)
+
+
+    # Results go to stdout whatever the log level, after the game events logged so far.
+    @staticmethod
+    def print_result(range_strs: list[str], result: RangeEquity, prefix: str = '') -> None:
+        LOGGER.flush()
+        print('{}{} {} deals'.format(prefix, 'exact' if result.exact else 'random', result.deals))
+        for i, range_str in enumerate(range_strs):
+            print('Player{} {:<20} win {:>7.2%} tie {:>7.2%} equity {:>7.2%}'.format(i, range_str, result.wins[i], result.ties[i], result.equities[i]))
+
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+class FlopTable:
+    '''This class is a lookup file of equity on the flop, built offline for all 1755 canonical flops.
+    A flop and hole cards are mapped to canonical suits, and the file is memory-mapped, so a lookup reads 2 bytes.
+    Diamonds make the highest straight flush in this game, so swapping suits is an approximation for straight flushes.
+
+    Attributes:
+        path: Path of the table file
+        samples: Number of deals of every equity in the table
+        max_opponents: Equities are stored for 1 to max_opponents opponents
+        data: Memory map of the table file
+    '''
+    flops: list[tuple] = []     # Canonical flops as sorted card indexes
+    flop_symmetries: dict[tuple, tuple[int, list]] = {}    # Every flop -> (canonical flop index, suit maps to it)
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.max_opponents, self.samples = FLOP_TABLE_HEADER.unpack_from(self.data, 0)
+        if magic != FLOP_TABLE_MAGIC or version != FLOP_TABLE_VERSION:
+            raise ValueError
+        FlopTable.canonical_flops()
+
+
+    def lookup(self, initial_cards: list[Card], flop: list[Card], number_of_opponents: int) -> float:
+        """Look up equity of initial cards on the flop against random cards of opponents.
+
+        Returns:
+            The equity, or None if the table has no entry for it.
+        """
+        if not 1 <= number_of_opponents <= self.max_opponents:
+            return None
+
+        flop_index, hole_index = FlopTable.canonical_index(initial_cards, flop)
+        offset = FLOP_TABLE_HEADER.size + 2 * ((flop_index * 1326 + hole_index) * self.max_opponents + number_of_opponents - 1)
+        value = struct.unpack_from('<H', self.data, offset)[0]
+        if value == FLOP_TABLE_EMPTY:
+            return None
+        return value / FLOP_TABLE_SCALE
+
+
+    def close(self) -> None:
+        self.data.close()
+
+
+    @staticmethod
+    def canonical_flops() -> list[tuple]:
+        """List the canonical flops, the smallest flop among the flops with swapped suits.
+        It also keeps the suit maps from every flop to its canonical flop.
+
+        Returns:
+            The sorted canonical flops.
+        """
+        if len(FlopTable.flops) == 0:
+            suit_maps = list(itertools.permutations(range(4)))
+            canonical: dict[tuple, tuple[tuple, list]] = {}
+
+            for flop in itertools.combinations(range(52), 3):
+                mapped = [(FlopTable.map_suits(flop, suit_map), suit_map) for suit_map in suit_maps]
+                smallest = min([cards for cards, suit_map in mapped])
+                canonical[flop] = (smallest, [suit_map for cards, suit_map in mapped if cards == smallest])
+
+            FlopTable.flops = sorted(set([smallest for smallest, suit_maps in canonical.values()]))
+            flop_indexes = {flop: i for i, flop in enumerate(FlopTable.flops)}
+            for flop, (smallest, suit_maps) in canonical.items():
+                FlopTable.flop_symmetries[flop] = (flop_indexes[smallest], suit_maps)
+
+        return FlopTable.flops
+
+
+    @staticmethod
+    def map_suits(indexes, suit_map) -> tuple:
+        return tuple(sorted([suit_map[index // 13] * 13 + index % 13 for index in indexes]))
+
+
+    # Index of 2 card indexes i < j among all 1326 pairs.
+    @staticmethod
+    def hole_index(i: int, j: int) -> int:
+        return i * 51 - i * (i - 1) // 2 + j - i - 1
+
+
+    @staticmethod
+    def canonical_index(initial_cards: list[Card], flop: list[Card]) -> tuple[int, int]:
+        flop_index, suit_maps = FlopTable.flop_symmetries[tuple(sorted([Deck.card_index(card) for card in flop]))]
+        hole = [Deck.card_index(card) for card in initial_cards]
+        return flop_index, min([FlopTable.hole_index(*FlopTable.map_suits(hole, suit_map)) for suit_map in suit_maps])
+
+
+    @staticmethod
+    def build(path: str, samples: int = FLOP_TABLE_SAMPLES, workers: int = None, max_opponents: int = MAX_OPPONENTS) -> None:
+        """Build the table file on all cores. Every canonical flop is one task, which is written as soon as it is done.
+        """
+        flops = FlopTable.canonical_flops()
+        block_size = 1326 * max_opponents * 2
+
+        with open(path, 'wb') as f:
+            f.write(FLOP_TABLE_HEADER.pack(FLOP_TABLE_MAGIC, FLOP_TABLE_VERSION, max_opponents, samples))
+            for i in range(len(flops)):
+                f.write(b'\xff' * block_size)
+
+            with multiprocessing.Pool(workers, **SharedCache.pool_args()) as pool:
+                tasks = [(flop_index, samples, max_opponents) for flop_index in range(len(flops))]
+                for number_of_done, (flop_index, block) in enumerate(pool.imap_unordered(FlopTable.build_flop, tasks), 1):
+                    f.seek(FLOP_TABLE_HEADER.size + flop_index * block_size)
+                    f.write(block)
+                    LOGGER.info('flop_table', 'Flop table: {} of {} flops done.', number_of_done, len(flops))
+
+
+    @staticmethod
+    def build_flop(task: tuple) -> tuple[int, bytes]:
+        """Estimate equities of all canonical hole cards on one canonical flop.
+
+        Returns:
+            The flop index and its block of the table file.
+        """
+        flop_index, samples, max_opponents = task
+        random.seed(flop_index)
+        flop_indexes = FlopTable.canonical_flops()[flop_index]
+        flop = [Deck.index_card(index) for index in flop_indexes]
+        block = bytearray(b'\xff' * (1326 * max_opponents * 2))
+
+        for i, j in itertools.combinations(range(52), 2):
+            if i in flop_indexes or j in flop_indexes:
+                continue
+
+            initial_cards = [Deck.index_card(i), Deck.index_card(j)]
+            hole_index = FlopTable.hole_index(i, j)
+            if FlopTable.canonical_index(initial_cards, flop)[1] != hole_index:
+                continue
+
+            for number_of_opponents in range(1, max_opponents + 1):
+                equity = Trainer(number_of_opponents).estimate(initial_cards, flop, samples, SAMPLING_STRATIFIED)
+                value = round(equity.ratio * FLOP_TABLE_SCALE)
+                struct.pack_into('<H', block, 2 * (hole_index * max_opponents + number_of_opponents - 1), value)
+
+        return flop_index, bytes(block)
+
+
+class HandMemo:
+    '''This class remembers ranks of hands, so a hand seen again is looked up instead of ranked again.
+    Hands are keyed in a form which ignores card order. With suits, spades, clubs and hearts can also be swapped,
+    while diamonds are kept, because only a diamond straight flush is a royal flush in this game.
+    It keeps at most size hands and forgets the least recently used one.
+
+    Attributes:
+        size: Most hands kept
+        suits: Whether hands with swapped suits share one key
+        ranks: Rank and rank values of hands, in the order they were used
+        hits: Number of ranks looked up
+        misses: Number of ranks computed
+    '''
+    def __init__(self, size: int = HAND_MEMO_SIZE, suits: bool = False):
+        self.size = size
+        self.suits = suits
+        self.ranks: collections.OrderedDict[tuple, tuple] = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def key(self, cards: list[Card]) -> tuple:
+        if not self.suits:
+            return tuple(sorted([Deck.card_index(card) for card in cards]))
+
+        values = {'S': [], 'D': [], 'C': [], 'H': []}
+        for card in cards:
+            values[card.suit].append(card.value)
+        for suit in values:
+            values[suit] = tuple(sorted(values[suit]))
+
+        return values['D'], tuple(sorted([values['S'], values['C'], values['H']]))
+
+
+    # Set rank and rank values of player, from memo if the hand was seen.
+    def rank(self, player: Player) -> None:
+        key = self.key(player.initial_cards + player.community_cards)
+        rank = self.ranks.get(key)
+
+        if rank is None:
+            self.misses += 1
+            METRICS.counters['memo_misses'] += 1
+            player.check_rank()
+            self.ranks[key] = (player.rank, tuple(player.rank_values))
+            if len(self.ranks) > self.size:
+                self.ranks.popitem(last=False)
+        else:
+            self.hits += 1
+            METRICS.counters['memo_hits'] += 1
+            self.ranks.move_to_end(key)
+            player.rank = rank[0]
+            player.rank_values = list(rank[1])
+
+
+class SharedCache:
+    '''This class is a cache of hand ranks and equities in a memory-mapped file, shared by all processes which open it.
+    Pages of the file are shared by the operating system, so memory stays flat as workers are added.
+    Both are open-addressing hash tables. Anyone reads without a lock; adding takes a lock on the file and writes the
+    value before the key. Every entry has a check of its key, and an equity entry's check covers its value as well,
+    so an equity can be replaced by one with more samples. A half written entry is never used.
+
+    Attributes:
+        path: Path of the cache file
+        rank_slots: Number of rank entries
+        equity_slots: Number of equity entries
+        data: Memory map of the cache file
+    '''
+    def __init__(self, path: str, rank_slots: int = SHARED_RANK_SLOTS, equity_slots: int = SHARED_EQUITY_SLOTS):
+        self.path = path
+        self.file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT), 'r+b')
+        self.lock = threading.Lock()
+
+        with self.locked():
+            self.file.seek(0)
+            header = self.file.read(SHARED_CACHE_HEADER.size)
+            valid = False
+            if len(header) == SHARED_CACHE_HEADER.size:
+                magic, version, evaluator_version, probes, self.rank_slots, self.equity_slots = SHARED_CACHE_HEADER.unpack(header)
+                valid = magic == SHARED_CACHE_MAGIC and version == SHARED_CACHE_VERSION and evaluator_version == EVALUATOR_VERSION and probes == SHARED_CACHE_PROBES
+
+            if not valid:   # A new file, or a file of another evaluator
+                self.rank_slots = rank_slots
+                self.equity_slots = equity_slots
+                self.file.truncate(0)
+                self.file.truncate(SHARED_CACHE_HEADER.size + rank_slots * SHARED_RANK_ENTRY.size + equity_slots * SHARED_EQUITY_ENTRY.size)
+                self.file.seek(0)
+                self.file.write(SHARED_CACHE_HEADER.pack(SHARED_CACHE_MAGIC, SHARED_CACHE_VERSION, EVALUATOR_VERSION, SHARED_CACHE_PROBES, rank_slots, equity_slots))
+                self.file.flush()
+
+        self.data = mmap.mmap(self.file.fileno(), 0)
+        self.equity_offset = SHARED_CACHE_HEADER.size + self.rank_slots * SHARED_RANK_ENTRY.size
+
+
+    # Lock adding to the cache across threads, and across processes where fcntl is available.
+    @contextlib.contextmanager
+    def locked(self):
+        with self.lock:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+
+    card_bits: dict[Card, int] = {}     # Bit of every card in a hand key
+
+    @staticmethod
+    def hand_bits(cards: list[Card]) -> int:
+        if len(SharedCache.card_bits) == 0:
+            for index in range(52):
+                SharedCache.card_bits[Deck.index_card(index)] = 1 << index
+        return sum(map(SharedCache.card_bits.__getitem__, cards))
+
+
+    @staticmethod
+    def check(key: int) -> int:
+        return ((key * 0x9E3779B97F4A7C15) >> 32) & 0xFFFFFFFF | 1
+
+
+    # Slot a key is first looked for at, the next slots follow it.
+    @staticmethod
+    def first_slot(key: int, number_of_slots: int) -> int:
+        return (key * 0xC2B2AE3D27D4EB4F >> 17) % number_of_slots
+
+
+    # Pack the number of rank values into 3 bits, then rank and up to 5 rank values into 4 bits each.
+    @staticmethod
+    def pack_rank(rank: int, rank_values: list[int]) -> int:
+        assert(len(rank_values) <= 5 and 0 <= rank < 16 and all(0 <= value < 16 for value in rank_values))
+        packed = len(rank_values) | rank << 3
+        for i, value in enumerate(rank_values):
+            packed |= value << (7 + 4 * i)
+        return packed
+
+
+    @staticmethod
+    def unpack_rank(packed: int) -> tuple[int, list[int]]:
+        rank_values = [(packed >> (7 + 4 * i)) & 15 for i in range(packed & 7)]
+        return (packed >> 3) & 15, rank_values
+
+
+    # Set rank and rank values of player from the cache, or rank the cards and add them.
+    def rank(self, player: Player) -> None:
+        key = SharedCache.hand_bits(player.initial_cards + player.community_cards)
+        first_slot = SharedCache.first_slot(key, self.rank_slots)
+        for i in range(SHARED_CACHE_PROBES):
+            offset = SHARED_CACHE_HEADER.size + (first_slot + i) % self.rank_slots * SHARED_RANK_ENTRY.size
+            slot_key, packed, check = SHARED_RANK_ENTRY.unpack_from(self.data, offset)
+            if slot_key == 0:
+                break
+            if slot_key == key and check == SharedCache.check(key):
+                player.rank, player.rank_values = SharedCache.unpack_rank(packed)
+                METRICS.counters['shared_hits'] += 1
+                return
+
+        METRICS.counters['shared_misses'] += 1
+        player.rank_cards()
+        packed = SharedCache.pack_rank(player.rank, player.rank_values)
+        with self.locked():
+            for i in range(SHARED_CACHE_PROBES):
+                offset = SHARED_CACHE_HEADER.size + (first_slot + i) % self.rank_slots * SHARED_RANK_ENTRY.size
+                slot_key = struct.unpack_from('<Q', self.data, offset)[0]
+                if slot_key == key:
+                    return
+                if slot_key == 0:
+                    struct.pack_into('<II', self.data, offset + 8, packed, SharedCache.check(key))
+                    struct.pack_into('<Q', self.data, offset, key)
+                    return
+
+
+    # Check of an equity entry from its keys and the bytes of its ratio, standard error and samples.
+    @staticmethod
+    def equity_check(key1: int, key2: int, value: bytes) -> int:
+        return SharedCache.check(key1 ^ key2 ^ int.from_bytes(value, 'little'))
+
+
+    @staticmethod
+    def equity_key(hero_cards: list[Card], community_cards: list[Card], number_of_opponents: int, sampling: str) -> tuple[int, int]:
+        key1 = SharedCache.hand_bits(hero_cards) | number_of_opponents << 52 | SAMPLINGS.index(sampling) << 58
+        return key1, SharedCache.hand_bits(community_cards) | 1 << 63
+
+
+    def equity(self, hero_cards: list[Card], community_cards: list[Card], number_of_opponents: int, sampling: str, number_of_samples: int) -> Equity:
+        """Look up an equity estimated with at least number_of_samples deals.
+
+        Returns:
+            The equity, or None if the cache has none.
+        """
+        key1, key2 = SharedCache.equity_key(hero_cards, community_cards, number_of_opponents, sampling)
+        first_slot = SharedCache.first_slot(key1 ^ key2, self.equity_slots)
+        for i in range(SHARED_CACHE_PROBES):
+            offset = self.equity_offset + (first_slot + i) % self.equity_slots * SHARED_EQUITY_ENTRY.size
+            entry = SHARED_EQUITY_ENTRY.unpack(self.data[offset:offset + SHARED_EQUITY_ENTRY.size])
+            if entry[0] == 0:
+                break
+            if entry[0] == key1 and entry[1] == key2:
+                value = self.data[offset + 16:offset + 28]
+                if entry[5] != SharedCache.equity_check(key1, key2, value) or entry[4] < number_of_samples:
+                    break
+                METRICS.counters['shared_hits'] += 1
+                return Equity(entry[2], entry[3], entry[4], 0)
+
+        METRICS.counters['shared_misses'] += 1
+        return None
+
+
+    # Add an equity, or replace the cached one if it has fewer samples.
+    def add_equity(self, hero_cards: list[Card], community_cards: list[Card], number_of_opponents: int, sampling: str, equity: Equity) -> None:
+        key1, key2 = SharedCache.equity_key(hero_cards, community_cards, number_of_opponents, sampling)
+        first_slot = SharedCache.first_slot(key1 ^ key2, self.equity_slots)
+        value = struct.pack('<ffI', equity.ratio, equity.stderr, equity.samples)
+        check = SharedCache.equity_check(key1, key2, value)
+        with self.locked():
+            for i in range(SHARED_CACHE_PROBES):
+                offset = self.equity_offset + (first_slot + i) % self.equity_slots * SHARED_EQUITY_ENTRY.size
+                slot_key1, slot_key2 = struct.unpack_from('<QQ', self.data, offset)
+                if slot_key1 == key1 and slot_key2 == key2:
+                    if struct.unpack_from('<I', self.data, offset + 24)[0] < equity.samples:
+                        self.data[offset + 16:offset + 32] = value + struct.pack('<I', check)
+                    return
+                if slot_key1 == 0:
+                    self.data[offset + 8:offset + 32] = struct.pack('<Q', key2) + value + struct.pack('<I', check)
+                    struct.pack_into('<Q', self.data, offset, key1)
+                    return
+
+
+    @staticmethod
+    def install(path: str) -> None:
+        """Open the cache as the one check_rank and Trainer.estimate use. Pools pass it to workers with init_worker.
+        """
+        global SHARED_CACHE
+        SHARED_CACHE = None if path is None else SharedCache(path)
+
+
+    @staticmethod
+    def pool_args() -> dict:
+        return {'initializer': SharedCache.init_worker, 'initargs': (SHARED_CACHE.path if SHARED_CACHE is not None else None,)}
+
+
+    @staticmethod
+    def init_worker(path: str) -> None:
+        SharedCache.install(path)
+
+
+SHARED_CACHE: SharedCache = None
+
+
+class Evaluators:
+    '''This class is the registry of backends for ranking a hand and for estimating equity against random cards.
+    The reference backends are the methods of Player and Trainer, and they stay available to check the others against.
+    Autotune times every backend on this host, keeps only the ones which agree with the reference, and caches the
+    fastest choice of every operation in a file.
+
+    Attributes:
+        backends: Backend functions of every operation by name
+        chosen: Name of the backend used for every operation
+        rank_hand: Function ranking a hand, or None for the reference in Player
+        estimate_equity: Function estimating equity, or None for the reference in Trainer
+    '''
+    backends: dict[str, dict] = {'rank': {}, 'equity': {}}
+    chosen: dict[str, str] = {'rank': 'reference', 'equity': 'reference'}
+    rank_hand = None
+    estimate_equity = None
+    value_ranks: dict[tuple, tuple] = {}    # Ranks of hands without a flush by their values
+    code_keys: dict[int, int] = {}          # Rank keys of hands without a flush by their value counts in base 5
+    pool = None
+    pool_workers = 0
+
+
+    # Backends of an operation which can run in this process. Workers of a pool are daemons, which may not
+    # start a pool of their own.
+    @staticmethod
+    def available(operation: str) -> dict:
+        backends = dict(Evaluators.backends[operation])
+        if multiprocessing.current_process().daemon:
+            backends.pop('process', None)
+        return backends
+
+
+    @staticmethod
+    def register(operation: str, name: str, function) -> None:
+        Evaluators.backends[operation][name] = function
+
+
+    @staticmethod
+    def use(operation: str, name: str) -> None:
+        function = Evaluators.backends[operation][name]
+        Evaluators.chosen[operation] = name
+        if operation == 'rank':
+            Evaluators.rank_hand = None if name == 'reference' else function
+        else:
+            Evaluators.estimate_equity = None if name == 'reference' else function
+
+
+    @staticmethod
+    def rank_reference(cards: list[Card]) -> tuple[int, list[int]]:
+        player = Player('')
+        player.set_initial_cards(list(cards))
+        player.check_suit_rank()
+        player.check_straight()
+        player.check_value_rank()
+        return player.rank, player.rank_values
+
+
+    # Without a flush, the rank only depends on the values, so it is looked up in a table filled as hands are seen.
+    @staticmethod
+    def rank_table(cards: list[Card]) -> tuple[int, list[int]]:
+        suits = [card.suit for card in cards]
+        if len(cards) >= 5 and max(suits.count(suit) for suit in 'SDCH') >= 5:
+            return Evaluators.rank_reference(cards)
+
+        key = tuple(sorted([card.value for card in cards]))
+        ranked = Evaluators.value_ranks.get(key)
+        if ranked is None:
+            rank, rank_values = Evaluators.rank_reference(cards)
+            ranked = Evaluators.value_ranks[key] = (rank, tuple(rank_values))
+        return ranked[0], list(ranked[1])
+
+
+    @staticmethod
+    def rank_numpy(cards: list[Card]) -> tuple[int, list[int]]:
+        key = int(Evaluators.rank_keys_numpy(numpy.array([[Deck.card_index(card) for card in cards]]))[0])
+        return Evaluators.decode_key(key)
+
+
+    # Rank key as one integer, ordered as Player.rank_key.
+    @staticmethod
+    def encode_key(rank: int, rank_values: list[int]) -> int:
+        if rank == 0:
+            return 9 * 15 ** 5
+        key = 9 - rank
+        for i in range(5):
+            key = key * 15 + (rank_values[i] if i < len(rank_values) else 0)
+        return key
+
+
+    @staticmethod
+    def decode_key(key: int) -> tuple[int, list[int]]:
+        rank_values = []
+        for i in range(5):
+            key, value = divmod(key, 15)
+            rank_values.append(value)
+        rank_values = [value for value in reversed(rank_values) if value > 0]
+        if key == 9:
+            return 0, rank_values
+        return 9 - key, rank_values
+
+
+    @staticmethod
+    def rank_keys_numpy(cards):
+        """Rank a batch of hands given as rows of card indexes. Hands without a flush are grouped by their value counts,
+        and every group is ranked once by the reference; hands with a flush are ranked one by one.
+
+        Returns:
+            Rank keys of the hands as encoded by encode_key.
+        """
+        values = cards % 13
+        counts = (values[:, :, None] == numpy.arange(13)).sum(axis=1)
+        codes = counts @ (5 ** numpy.arange(13, dtype=numpy.int64))
+        flush = ((cards[:, :, None] // 13 == numpy.arange(4)).sum(axis=1) >= 5).any(axis=1)
+
+        unique_codes, inverse = numpy.unique(codes, return_inverse=True)
+        unique_keys = numpy.empty(len(unique_codes), dtype=numpy.int64)
+        for i, code in enumerate(unique_codes.tolist()):
+            key = Evaluators.code_keys.get(code)
+            if key is None:
+                # Any hand with these values and suits dealt in turn has no flush.
+                hand = []
+                for value in range(13):
+                    for j in range(code // 5 ** value % 5):
+                        hand.append(Card('SDCH'[len(hand) % 4], value + 1))
+                key = Evaluators.code_keys[code] = Evaluators.encode_key(*Evaluators.rank_reference(hand))
+            unique_keys[i] = key
+
+        keys = unique_keys[inverse.reshape(-1)]
+        for row in numpy.nonzero(flush)[0]:
+            keys[row] = Evaluators.encode_key(*Evaluators.rank_reference([Deck.index_card(int(index)) for index in cards[row]]))
+        return keys
+
+
+    @staticmethod
+    def equity_reference(hero_cards: list[Card], community_cards: list[Card], number_of_opponents: int, number_of_samples: int) -> Equity:
+        estimate_equity = Evaluators.estimate_equity
+        Evaluators.estimate_equity = None
+        try:
+            return Trainer(number_of_opponents).estimate_deals(hero_cards, community_cards, number_of_samples, SAMPLING_UNIFORM, None)
+        finally:
+            Evaluators.estimate_equity = estimate_equity
+
+
+    # Deal all samples at once as rows of card indexes, and rank every hand of every deal in one batch.
+    @staticmethod
+    def equity_numpy(hero_cards: list[Card], community_cards: list[Card], number_of_opponents: int, number_of_samples: int) -> Equity:
+        rng = numpy.random.default_rng(random.getrandbits(64))
+        dealt = {Deck.card_index(card) for card in hero_cards + community_cards}
+        remaining = numpy.array([index for index in range(52) if index not in dealt])
+        number_of_board = 5 - len(community_cards)
+
+        order = numpy.argsort(rng.random((number_of_samples, len(remaining))), axis=1)[:, :number_of_board + 2 * number_of_opponents]
+        deals = remaining[order]
+        community = numpy.tile(numpy.array([Deck.card_index(card) for card in community_cards], dtype=deals.dtype), (number_of_samples, 1))
+        board = numpy.concatenate([community, deals[:, :number_of_board]], axis=1)
+
+        hands = [numpy.concatenate([numpy.tile(numpy.array([Deck.card_index(card) for card in hero_cards]), (number_of_samples, 1)), board], axis=1)]
+        for i in range(number_of_opponents):
+            hands.append(numpy.concatenate([deals[:, number_of_board + 2 * i:number_of_board + 2 * i + 2], board], axis=1))
+
+        keys = Evaluators.rank_keys_numpy(numpy.concatenate(hands)).reshape(number_of_opponents + 1, number_of_samples)
+        ratio = float((keys[0] >= keys[1:].max(axis=0)).mean())
+        METRICS.count('samples', number_of_samples)
+        return Equity(ratio, math.sqrt(ratio * (1 - ratio) / number_of_samples), number_of_samples, number_of_samples * (number_of_opponents + 1))
+
+
+    # Split the samples into one chunk for every worker, each estimated by the reference with its own seed.
+    @staticmethod
+    def equity_process(hero_cards: list[Card], community_cards: list[Card], number_of_opponents: int, number_of_samples: int) -> Equity:
+        if multiprocessing.current_process().daemon:       # A pool worker inherited the choice of its parent
+            return Evaluators.equity_reference(hero_cards, community_cards, number_of_opponents, number_of_samples)
+
+        if Evaluators.pool is None:
+            Evaluators.pool_workers = os.cpu_count() or 1
+            Evaluators.pool = multiprocessing.Pool(Evaluators.pool_workers, **SharedCache.pool_args())
+            atexit.register(Evaluators.pool.terminate)
+
+        workers = Evaluators.pool_workers
+        tasks = []
+        for i in range(workers):
+            samples = number_of_samples // workers + (1 if i < number_of_samples % workers else 0)
+            if samples > 0:
+                tasks.append((hero_cards, community_cards, number_of_opponents, samples, random.getrandbits(64)))
+
+        equity = None
+        for chunk in Evaluators.pool.map(Evaluators.equity_chunk, tasks):
+            equity = Trainer.merge_equity(equity, chunk)
+        return equity
+
+
+    @staticmethod
+    def equity_chunk(task: tuple) -> Equity:
+        hero_cards, community_cards, number_of_opponents, number_of_samples, seed = task
+        random.seed(seed)
+        return Evaluators.equity_reference(hero_cards, community_cards, number_of_opponents, number_of_samples)
+
+
+    @staticmethod
+    def host() -> dict:
+        return {
+            'machine': platform.machine(), 'processor': platform.processor(), 'cores': os.cpu_count(),
+            'python': platform.python_version(), 'numpy': numpy.__version__ if numpy is not None else None,
+            'evaluator': EVALUATOR_VERSION,
+        }
+
+
+    @staticmethod
+    def autotune(path: str = AUTOTUNE_FILE) -> dict[str, str]:
+        """Use the fastest backend of every operation, from the cache file if it was timed on this host.
+
+        Returns:
+            The chosen backend of every operation.
+        """
+        try:
+            with open(path, 'r') as f:
+                content = json.load(f)
+            if content['host'] == Evaluators.host() and all(name in Evaluators.available(operation) for operation, name in content['chosen'].items()):
+                for operation, name in content['chosen'].items():
+                    Evaluators.use(operation, name)
+                return dict(Evaluators.chosen)
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        chosen = {'rank': Evaluators.tune_rank(), 'equity': Evaluators.tune_equity()}
+        for operation, name in chosen.items():
+            Evaluators.use(operation, name)
+
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'host': Evaluators.host(), 'chosen': chosen}, f)
+        os.replace(temp_path, path)
+        return chosen
+
+
+    @staticmethod
+    def best_time(function) -> float:
+        best = None
+        for i in range(AUTOTUNE_REPEATS):
+            start_time = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start_time
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+
+    # Time rank backends on random hands, a backend which ranks any hand unlike the reference is never chosen.
+    @staticmethod
+    def tune_rank() -> str:
+        rng = random.Random(EVALUATOR_VERSION)
+        hands = [rng.sample(Deck().cards, 7) for i in range(AUTOTUNE_HANDS)]
+        expected = [Evaluators.rank_reference(hand) for hand in hands]
+
+        timings = {}
+        for name, function in Evaluators.available('rank').items():
+            if [function(hand) for hand in hands] != expected:
+                LOGGER.warning('autotune', 'Autotune: rank backend {} disagrees with the reference.', name)
+                continue
+            timings[name] = Evaluators.best_time(lambda: [function(hand) for hand in hands])
+            LOGGER.info('autotune', 'Autotune: rank backend {} ranks a hand in {:.2f} us.', name, timings[name] / len(hands) * 1e6)
+        return min(timings, key=timings.get)
+
+
+    # Time equity backends on random flops, a backend whose equity is off by more than 5 standard errors is never chosen.
+    @staticmethod
+    def tune_equity() -> str:
+        rng = random.Random(EVALUATOR_VERSION)
+        spots = []
+        for i in range(AUTOTUNE_SPOTS):
+            cards = rng.sample(Deck().cards, 5)
+            spots.append((cards[:2], cards[2:], 1 + i % 3))
+
+        expected = [Evaluators.equity_reference(*spot, 4 * AUTOTUNE_SAMPLES) for spot in spots]
+        timings = {}
+        for name, function in Evaluators.available('equity').items():
+            function(*spots[0], AUTOTUNE_SAMPLES)       # Warm up pools and tables before timing
+            equities = [function(*spot, AUTOTUNE_SAMPLES) for spot in spots]
+            if any(abs(equity.ratio - reference.ratio) > 5 * math.hypot(equity.stderr, reference.stderr) + 0.01 for equity, reference in zip(equities, expected)):
+                LOGGER.warning('autotune', 'Autotune: equity backend {} disagrees with the reference.', name)
+                continue
+            timings[name] = Evaluators.best_time(lambda: [function(*spot, AUTOTUNE_SAMPLES) for spot in spots])
+            LOGGER.info('autotune', 'Autotune: equity backend {} estimates {} deals in {:.1f} ms.', name, AUTOTUNE_SAMPLES, timings[name] / len(spots) * 1e3)
+        return min(timings, key=timings.get)
+
+
+Evaluators.register('rank', 'reference', Evaluators.rank_reference)
+Evaluators.register('rank', 'table', Evaluators.rank_table)
+Evaluators.register('equity', 'reference', Evaluators.equity_reference)
+Evaluators.register('equity', 'process', Evaluators.equity_process)
+if numpy is not None:
+    Evaluators.register('rank', 'numpy', Evaluators.rank_numpy)
+    Evaluators.register('equity', 'numpy', Evaluators.equity_numpy)
+
+
+class CorpusGenerator:
+    '''This class generates labeled test cases for file mode. Every player has 2 cards and the same 5 community cards,
+    and the winner, or a tie, is judged by Game. Chunks of cases are generated by worker processes, each
+    with its own random generator seeded from the seed and the chunk, so a seed always gives the same corpus.
+
+    Attributes:
+        dir_path: Directory the case files and test_results.txt are written to
+        seed: Seed of the corpus
+        number_of_players: Number of players of every case, or None for random 2 to 10
+    '''
+    def __init__(self, dir_path: str, seed: int = 0, number_of_players: int = None):
+        self.dir_path = dir_path
+        self.seed = seed
+        self.number_of_players = number_of_players
+
+
+    def generate(self, number_of_cases: int, workers: int = None) -> None:
+        os.makedirs(self.dir_path, exist_ok=True)
+        tasks = []
+        for first_case in range(0, number_of_cases, GENERATE_CHUNK):
+            tasks.append((self.dir_path, self.seed, self.number_of_players, first_case, min(GENERATE_CHUNK, number_of_cases - first_case)))
+
+        with open(os.path.join(self.dir_path, TEST_CASES_FILE), 'w', buffering=1 << 20) as f:
+            with multiprocessing.Pool(workers, **SharedCache.pool_args()) as pool:
+                for rows in pool.imap(CorpusGenerator.generate_chunk, tasks):
+                    f.write(rows)
+                    LOGGER.info('generate', 'Generator: {} cases written.', rows.count('\n'))
+
+
+    @staticmethod
+    def generate_chunk(task: tuple) -> str:
+        """Generate and write the case files of one chunk.
+
+        Returns:
+            The rows of test_results.txt for the chunk.
+        """
+        dir_path, seed, number_of_players, first_case, number_of_cases = task
+        rng = random.Random('{}-{}'.format(seed, first_case))
+        game = Game()
+        rows = []
+
+        for i in range(first_case, first_case + number_of_cases):
+            cards = Deck().cards
+            rng.shuffle(cards)
+            players = number_of_players or rng.randint(2, 10)
+            board = cards[2 * players:2 * players + 5]
+
+            case = TestCase()
+            case.set_name('case{:07d}.txt'.format(i))
+            lines = []
+            for j in range(players):
+                player_cards = cards[2 * j:2 * j + 2] + board
+                case.add_player(str(j), player_cards)
+                lines.append(','.join([str(j)] + HandHistory.encode_cards(player_cards)))
+
+            result = game.judge_case(case)
+            if len(result.winners) > 1:
+                rows.append(case.name)
+            else:
+                rows.append('{},{}'.format(case.name, result.winners[0]))
+
+            with open(os.path.join(dir_path, case.name), 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+
+        return '\n'.join(rows) + '\n'
+
+
+class PolicyTable:
+    '''This class is a compact array file of bot actions, solved offline, so a bot decides without training.
+    The state is round 1 or 2, hand bucket (rank and highest rank value of the cards so far), number of opponents,
+    limp bets and stack. An entry is the amount to bet, POLICY_LIMP to follow limp bets, or POLICY_FOLD.
+    The solver deals complete matches and keeps, for every state, the action of the highest expected value among
+    folding, following and every bet up to the stack. Every seat of the bot in the round is taken as equally likely:
+    opponents before the bot have put limp bets in the pot and stay in, and opponents after it answer its bet by the
+    bots' action table on the win ratio of their own bucket, so a bet can make them fold.
+
+    Attributes:
+        path: Path of the policy file
+        max_opponents: Actions are stored for 1 to max_opponents opponents
+        max_bets: Limp bets and stacks are stored for 0 to max_bets
+        data: Memory map of the policy file
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, buckets, self.max_opponents, self.max_bets = POLICY_HEADER.unpack_from(self.data, 0)
+        if magic != POLICY_MAGIC or version != POLICY_VERSION or buckets != POLICY_BUCKETS:
+            raise ValueError
+
+
+    def lookup(self, initial_cards: list[Card], community_cards: list[Card], number_of_opponents: int, limp_bets: int, stack: int) -> tuple[str, int]:
+        round_index = 0 if len(community_cards) < 5 else 1
+        number_of_opponents = min(max(1, number_of_opponents), self.max_opponents)
+        bucket = PolicyTable.hand_bucket(initial_cards + community_cards)
+
+        index = ((round_index * POLICY_BUCKETS + bucket) * self.max_opponents + number_of_opponents - 1) * (self.max_bets + 1)
+        index = (index + min(limp_bets, self.max_bets)) * (self.max_bets + 1) + min(stack, self.max_bets)
+        value = self.data[POLICY_HEADER.size + index]
+
+        if value == POLICY_FOLD:
+            return ACTION_FOLD, 0
+        elif value == POLICY_LIMP:
+            return ACTION_BET, limp_bets
+        return ACTION_BET, value
+
+
+    @staticmethod
+    def hand_bucket(cards: list[Card]) -> int:
+        return PolicyTable.key_bucket(Player.evaluate(cards))
+
+
+    @staticmethod
+    def key_bucket(key: tuple) -> int:
+        rank, rank_values = key
+        rank = 9 - rank
+        value = rank_values[0] if len(rank_values) > 0 else 14
+        return rank * 13 + value - 2
+
+
+    @staticmethod
+    def build(path: str, samples: int = POLICY_SAMPLES, workers: int = None, max_opponents: int = MAX_OPPONENTS) -> None:
+        """Solve the action of every state on all cores, and write them. The win ratio of every bucket is solved
+        first, since opponents answer bets by the action table on the ratio of their bucket.
+        """
+        states = [(round_index, number_of_opponents) for round_index in range(2) for number_of_opponents in range(1, max_opponents + 1)]
+        bot = BotPlayer('')
+        with multiprocessing.Pool(workers, **SharedCache.pool_args()) as pool:
+            ratios = pool.map(PolicyTable.solve_ratios, [state + (samples,) for state in states])
+            values = pool.map(PolicyTable.solve_values, [state + (samples, state_ratios, bot.action_table) for state, state_ratios in zip(states, ratios)])
+
+        data = bytearray()
+        for round_index in range(2):
+            for bucket in range(POLICY_BUCKETS):
+                for number_of_opponents in range(1, max_opponents + 1):
+                    i = round_index * max_opponents + number_of_opponents - 1
+                    for limp_bets in range(POLICY_MAX_BETS + 1):
+                        for stack in range(POLICY_MAX_BETS + 1):
+                            data.append(PolicyTable.best_action(bot, values[i][bucket], ratios[i][bucket], number_of_opponents, limp_bets, stack))
+
+        with open(path, 'wb') as f:
+            f.write(POLICY_HEADER.pack(POLICY_MAGIC, POLICY_VERSION, POLICY_BUCKETS, max_opponents, POLICY_MAX_BETS))
+            f.write(data)
+
+
+    @staticmethod
+    def best_action(bot: BotPlayer, bucket_values: list, ratio: float, number_of_opponents: int, limp_bets: int, stack: int) -> int:
+        """The entry of the bet of the highest expected value, where a bet is won back with the limp bets of the
+        opponents before and the bets of followers, or lost. Folding is worth nothing, and it is only chosen if every bet loses on average.
+        A bucket which was never dealt is decided by the action table on its smoothed ratio.
+
+        Returns:
+            The amount to bet, POLICY_LIMP or POLICY_FOLD.
+        """
+        deals, takes, gains, losses = bucket_values
+        if deals == 0:
+            action, bets = bot.choose_action(ratio, limp_bets)
+            if action == ACTION_FOLD:
+                return POLICY_FOLD
+            return POLICY_LIMP if bets == limp_bets else min(bets, stack)
+
+        best_bets = None
+        best_value = 0.0
+        for bets in range(min(limp_bets, stack), stack + 1):    # All in is the only bet below limp bets
+            value = (takes[bets] * limp_bets + gains[bets] - losses[bets] * bets) / (deals * (number_of_opponents + 1))
+            if best_bets is None or value > best_value:
+                best_bets, best_value = bets, value
+
+        if best_value < 0:
+            return POLICY_FOLD
+        return POLICY_LIMP if best_bets == limp_bets else best_bets
+
+
+    # Most bets a bot with ratio follows by the action table, and the floor it raises smaller bets to, or -1 if it folds.
+    @staticmethod
+    def follow_range(ratio: float, action_table: list[tuple]) -> tuple[int, int]:
+        for action_item in action_table:
+            if ratio < action_item[0]:
+                if action_item[1] == ACTION_FOLD:
+                    return -1, 0
+                return action_item[3], action_item[2]
+        return POLICY_MAX_BETS, 0
+
+
+    @staticmethod
+    def solve_ratios(task: tuple) -> list[float]:
+        """Deal complete matches, and count wins of hero in the bucket of hero's cards of the round.
+        Buckets are smoothed with 1 win and 1 loss, so a bucket never dealt has ratio 0.5.
+
+        Returns:
+            Win ratio of every bucket.
+        """
+        round_index, number_of_opponents, samples = task
+        random.seed('{}-{}'.format(round_index, number_of_opponents))
+        number_of_board = 3 if round_index == 0 else 5
+        wins = [1] * POLICY_BUCKETS
+        counts = [2] * POLICY_BUCKETS
+
+        deck = Deck()
+        for i in range(samples):
+            cards = random.sample(deck.cards, 7 + 2 * number_of_opponents)
+            board = cards[2:7]
+            bucket = PolicyTable.hand_bucket(cards[:2] + board[:number_of_board])
+            hero_key = Player.evaluate(cards[:7])
+
+            counts[bucket] += 1
+            wins[bucket] += 1
+            for j in range(7, len(cards), 2):
+                if Player.evaluate(cards[j:j + 2] + board) > hero_key:
+                    wins[bucket] -= 1
+                    break
+
+        return [win / count for win, count in zip(wins, counts)]
+
+
+    @staticmethod
+    def solve_values(task: tuple) -> list[list]:
+        """Deal complete matches, and sum what every bet makes in the bucket of hero's cards of the round, over
+        every seat of hero. Opponents before hero are in for limp bets. An opponent after hero follows a bet up to
+        the ceiling of the grade of its bucket's ratio, raising it to the floor, or folds. Hero takes the pot when
+        no opponent still in beats hero's hand.
+
+        Returns:
+            For every bucket, the number of deals, and for every bet, summed over the seats of hero, the number
+            of opponents before hero when hero takes the pot, the bets of followers hero wins and the number of
+            times hero loses.
+        """
+        round_index, number_of_opponents, samples, ratios, action_table = task
+        random.seed('values-{}-{}'.format(round_index, number_of_opponents))
+        number_of_board = 3 if round_index == 0 else 5
+        bet_range = range(POLICY_MAX_BETS + 1)
+        values = [[0, [0] * len(bet_range), [0] * len(bet_range), [0] * len(bet_range)] for bucket in range(POLICY_BUCKETS)]
+
+        deck = Deck()
+        for i in range(samples):
+            cards = random.sample(deck.cards, 7 + 2 * number_of_opponents)
+            board = cards[2:7]
+            bucket = PolicyTable.hand_bucket(cards[:2] + board[:number_of_board])
+            hero_key = Player.evaluate(cards[:7])
+
+            opponents = []      # Ceiling, floor and whether it beats hero, of every opponent
+            for j in range(7, len(cards), 2):
+                key = Player.evaluate(cards[j:j + 2] + board)
+                opponent_bucket = PolicyTable.key_bucket(key) if number_of_board == 5 else PolicyTable.hand_bucket(cards[j:j + 2] + board[:number_of_board])
+                opponents.append(PolicyTable.follow_range(ratios[opponent_bucket], action_table) + (key > hero_key,))
+
+            beaten_before = [False] * (number_of_opponents + 1)     # Whether an opponent from the i-th on beats hero
+            for j in range(number_of_opponents - 1, -1, -1):
+                beaten_before[j] = beaten_before[j + 1] or opponents[j][2]
+
+            bucket_values = values[bucket]
+            bucket_values[0] += 1
+            for bets in bet_range:
+                beaten = False
+                followed = 0
+                for after in range(number_of_opponents + 1):    # The first opponents answer hero, the others were before
+                    if beaten or beaten_before[after]:
+                        bucket_values[3][bets] += 1
+                    else:
+                        bucket_values[1][bets] += number_of_opponents - after
+                        bucket_values[2][bets] += followed
+
+                    if after < number_of_opponents:
+                        ceiling, floor, beats = opponents[after]
+                        if bets <= ceiling:
+                            followed += max(bets, floor)
+                            beaten = beaten or beats
+
+        return values
+
+
+class EquityWorker:
+    '''This class estimates equities on a background thread in chunks of deals, and puts every refined estimate
+    in a queue, so a window can show estimates while they are refined. Starting new jobs drops the old ones.
+
+    Attributes:
+        jobs: Jobs of (name, hero cards, community cards, number of opponents)
+        job_id: Id of the current jobs, which is given with every estimate
+        results: Queue of (job id, name, equity, progress between 0 and 1)
+    '''
+    def __init__(self, chunk: int = EQUITY_CHUNK, target: int = EQUITY_TARGET):
+        self.chunk = chunk
+        self.target = target
+        self.jobs: list[tuple] = []
+        self.job_id = 0
+        self.results = queue.Queue()
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    def start(self, jobs: list[tuple]) -> None:
+        with self.condition:
+            self.job_id += 1
+            self.jobs = jobs
+            self.condition.notify()
+
+
+    def stop(self) -> None:
+        self.start([])
+
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                while len(self.jobs) == 0:
+                    self.condition.wait()
+                job_id = self.job_id
+                jobs = self.jobs
+
+            equities: dict[str, Equity] = {}
+            for samples in range(self.chunk, self.target + 1, self.chunk):
+                for name, hero_cards, community_cards, number_of_opponents in jobs:
+                    if job_id != self.job_id:
+                        break
+
+                    equity = Trainer(number_of_opponents).estimate_deals(hero_cards, community_cards, self.chunk, SAMPLING_QUASI, None)
+                    equities[name] = Trainer.merge_equity(equities.get(name), equity)
+                    self.results.put((job_id, name, equities[name], samples / self.target))
+
+            with self.condition:
+                if job_id == self.job_id:
+                    self.jobs = []
+
+
+class DeadlineScheduler:
+    '''This class estimates the equity of all betting bots of a round within one shared time budget. Every bot
+    first gets a few deals. After that, each chunk of deals goes to the bot whose equity is the fewest standard
+    errors from a grade boundary of the action table, because its action is the least certain. The scheduler stops
+    when every action is certain by DEADLINE_CONFIDENCE standard errors, or when the measured cost of a deal says
+    no more deals fit before the deadline. The cost of a deal includes the cost of its chunk beyond the deals, and
+    the measured cost of one more chunk and of training the bots is kept free before the deadline. A chunk which
+    runs three times slower than measured can still overrun the deadline.
+
+    Attributes:
+        deadline: Time of time.perf_counter the estimates are done by
+        sampling: Sampling strategy of the deals
+        jobs: Player, opponent ranges, merged equity and measured seconds per deal of every bot
+        seconds_per_deal: Seconds per deal measured last of any bot, for bots not measured yet
+        deal_seconds: Least seconds per deal of any chunk, the cost of a deal without the overhead of its chunk
+        overhead: Most seconds a chunk took beyond its deals, to make a trainer, set up the deals and merge the equity
+        apply_seconds: Seconds training a bot took in apply the last round, shared by all schedulers
+        boundaries: Win ratios at which the action of the action table changes
+    '''
+    apply_seconds: float = 0.0
+
+    def __init__(self, budget: float, sampling: str = None):
+        self.start_time = time.perf_counter()
+        self.deadline = self.start_time + budget
+        self.sampling = sampling or SAMPLING_UNIFORM
+        self.jobs: list[list] = []
+        self.seconds_per_deal: float = None
+        self.deal_seconds = math.inf
+        self.overhead = 0.0
+        self.boundaries = [action_item[0] for action_item in BotPlayer.action_table[:-1]]
+
+
+    def add(self, player: Player, ranges: list) -> None:
+        self.jobs.append([player, ranges, None, None])
+
+
+    # Distance of the equity to the nearest boundary in standard errors. The ratio is smoothed for the error,
+    # so a few deals which all win or all lose are not taken as certain.
+    def margin(self, equity: Equity) -> float:
+        if equity is None:
+            return -1.0
+        if len(self.boundaries) == 0:
+            return math.inf
+
+        smoothed = (equity.ratio * equity.samples + 1) / (equity.samples + 2)
+        stderr = math.sqrt(smoothed * (1 - smoothed) / equity.samples)
+        return min(abs(equity.ratio - boundary) for boundary in self.boundaries) / stderr
+
+
+    # Add a chunk of deals to the equity of a job. Return False if no deal fits before the deadline.
+    def run_chunk(self, job: list, number_of_deals: int) -> bool:
+        player, ranges, equity, seconds_per_deal = job
+        seconds_per_deal = seconds_per_deal or self.seconds_per_deal
+        remaining = self.deadline - time.perf_counter() - self.reserve()
+        if remaining <= 0:
+            return False
+        if seconds_per_deal is None:
+            number_of_deals = min(number_of_deals, 4)       # Measure the cost of a deal first
+        else:
+            number_of_deals = min(number_of_deals, int(remaining / 3 / seconds_per_deal))     # A chunk overruns only if it is three times slower than measured
+        if number_of_deals < 1:
+            return False
+
+        start_time = time.perf_counter()
+        trainer = Trainer(len(ranges))
+        chunk = trainer.estimate_deals(player.initial_cards, player.community_cards, number_of_deals, self.sampling, ranges)
+        job[2] = Trainer.merge_equity(equity, chunk)
+        seconds = time.perf_counter() - start_time
+        self.deal_seconds = min(self.deal_seconds, seconds / chunk.samples)
+        self.overhead = max(self.overhead, seconds - chunk.samples * self.deal_seconds)
+        job[3] = self.seconds_per_deal = seconds / chunk.samples      # With the overhead of the chunk spread over its deals
+        return True
+
+
+    # Seconds kept free before the deadline, for the overhead of a chunk and for training every bot in apply.
+    def reserve(self) -> float:
+        return self.overhead + len(self.jobs) * DeadlineScheduler.apply_seconds
+
+
+    def run(self) -> None:
+        for job in self.jobs:
+            while job[2] is None or job[2].samples < DEADLINE_FIRST_DEALS:
+                if not self.run_chunk(job, DEADLINE_FIRST_DEALS - (job[2].samples if job[2] is not None else 0)):
+                    break
+
+        while len(self.jobs) > 0:
+            job = min(self.jobs, key=lambda job: self.margin(job[2]))
+            if self.margin(job[2]) >= DEADLINE_CONFIDENCE:
+                break
+            if not self.run_chunk(job, DEADLINE_FIRST_DEALS if job[2] is None else DEADLINE_CHUNK):
+                break
+
+        self.apply()
+
+
+    # Train bots with their equities, and report how close every one got to certain. A bot without a single
+    # deal takes an even share of the pot as its equity.
+    def apply(self) -> None:
+        start_time = time.perf_counter()
+        number_of_converged = 0
+        number_of_deals = 0
+        for player, ranges, equity, seconds_per_deal in self.jobs:
+            if equity is None:
+                player.number_of_train = len(ranges) + 1
+                player.number_of_train_win = 1
+                player.train_stderr = 0.0
+                LOGGER.debug('bot_equity', "Bot Player {}: no deal before the deadline, even equity.", player.id)
+                continue
+
+            player.number_of_train = equity.samples
+            player.number_of_train_win = round(equity.ratio * equity.samples)
+            player.train_stderr = equity.stderr
+            number_of_deals += equity.samples
+
+            margin = self.margin(equity)
+            if margin >= DEADLINE_CONFIDENCE:
+                number_of_converged += 1
+            LOGGER.debug('bot_equity', "Bot Player {}: equity {:.4f} +- {:.4f} with {} deals, {:.1f} standard errors from an action boundary.",
+                player.id, equity.ratio, equity.stderr, equity.samples, margin)
+
+        METRICS.count('samples', number_of_deals)
+        METRICS.count('deadline_bots', len(self.jobs))
+        METRICS.count('deadline_converged', number_of_converged)
+        LOGGER.info('deadline', 'Deadline: {} of {} bots converged with {} deals in {:.1f} ms.',
+            number_of_converged, len(self.jobs), number_of_deals, (time.perf_counter() - self.start_time) * 1e3)
+        if len(self.jobs) > 0:
+            DeadlineScheduler.apply_seconds = (time.perf_counter() - start_time) / len(self.jobs)
+
+
+class HandHistory:
+    '''This class records matches into an append-only hand-history log, one compact JSON record per line.
+    Records are buffered and written in batches, so a match costs no disk write of its own.
+
+    Attributes:
+        path: Path of the history file
+        batch_size: Number of records kept in buffer before writing
+        records: Encoded records waiting to be written
+    '''
+    def __init__(self, path: str, batch_size: int = HAND_HISTORY_BATCH):
+        self.path = path
+        self.batch_size = batch_size
+        self.records: list[str] = []
+        self.file = open(path, 'a')
+
+
+    def add(self, record: dict) -> None:
+        self.records.append(json.dumps(record, separators=(',', ':')))
+        if len(self.records) >= self.batch_size:
+            self.flush()
+
+
+    def flush(self) -> None:
+        if len(self.records) > 0:
+            self.file.write('\n'.join(self.records) + '\n')
+            self.file.flush()
+            self.records.clear()
+
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+
+    # Size of the history with every record written, which a checkpoint can truncate back to.
+    def size(self) -> int:
+        self.flush()
+        return self.file.tell()
+
+
+    def truncate(self, size: int) -> None:
+        self.records.clear()
+        self.file.truncate(size)
+
+
+    @staticmethod
+    def read(path: str):
+        """Read records one by one, so an archive of any size is never loaded into memory.
+
+        Returns:
+            A generator of records in the order they were written.
+        """
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+    @staticmethod
+    def encode_cards(cards: list[Card]) -> list[str]:
+        return ['{}{}'.format(card.suit, card.value) for card in cards]
+
+
+    @staticmethod
+    def decode_cards(cards_str: list[str]) -> list[Card]:
+        return [Card(card_str[0], int(card_str[1:])) for card_str in cards_str]
+
+
+class OutcomeStore:
+    '''This class stores the outcome of every player in every match as rows of fixed-width numeric columns.
+    Every column is a file of raw array values in a directory, rows are buffered and appended in chunks, and queries
+    read whole columns and group and filter them at once, with numpy when it is installed.
+
+    Attributes:
+        dir_path: Directory of the column files
+        columns: Buffered rows of every column
+        rows: Number of rows written to the column files
+    '''
+    def __init__(self, dir_path: str, chunk: int = OUTCOME_CHUNK):
+        self.dir_path = dir_path
+        self.chunk = chunk
+        os.makedirs(dir_path, exist_ok=True)
+        self.columns = {name: array.array(typecode) for name, typecode in OUTCOME_COLUMNS}
+        self.rows = self.count_rows()
+
+
+    def column_path(self, name: str) -> str:
+        return os.path.join(self.dir_path, name + '.col')
+
+
+    # Number of complete rows in the column files, a row cut off by an interrupted append is not counted.
+    def count_rows(self) -> int:
+        rows = None
+        for name, typecode in OUTCOME_COLUMNS:
+            path = self.column_path(name)
+            column_rows = os.path.getsize(path) // array.array(typecode).itemsize if os.path.exists(path) else 0
+            rows = column_rows if rows is None else min(rows, column_rows)
+        return rows
+
+
+    @staticmethod
+    def hand_class(cards: list[Card]) -> int:
+        """Class of starting cards in the 13 x 13 grid: pairs on the diagonal, suited above it and offsuit below it.
+
+        Returns:
+            The class index, 0 to 168.
+        """
+        high, low = sorted([(card.value - 2) % 13 for card in cards], reverse=True)
+        if cards[0].suit == cards[1].suit:
+            return high * 13 + low
+        return low * 13 + high
+
+
+    @staticmethod
+    def class_name(hand_class: int) -> str:
+        row, column = divmod(hand_class, 13)
+        if row == column:
+            return RANGE_VALUES[row] * 2
+        elif row > column:
+            return RANGE_VALUES[row] + RANGE_VALUES[column] + 's'
+        return RANGE_VALUES[column] + RANGE_VALUES[row] + 'o'
+
+
+    def add_match(self, match: int, players: list[Player], community_cards: list[Card], winner_list: list[Player], bets: list[int], payouts: list[int]) -> None:
+        board = [Deck.card_index(card) for card in community_cards] + [OUTCOME_NONE] * (5 - len(community_cards))
+        for seat, player in enumerate(players):
+            rank = OUTCOME_NONE
+            if not player.is_fold() and len(community_cards) == 5:
+                player.check_rank()
+                rank = player.rank
+
+            row = [match, seat, len(players), Deck.card_index(player.initial_cards[0]), Deck.card_index(player.initial_cards[1]),
+                OutcomeStore.hand_class(player.initial_cards)] + board + [rank, player.is_fold(), player in winner_list, bets[seat], payouts[seat]]
+            for (name, typecode), value in zip(OUTCOME_COLUMNS, row):
+                self.columns[name].append(value)
+
+        if len(self.columns['match']) >= self.chunk:
+            self.flush()
+
+
+    def flush(self) -> None:
+        if len(self.columns['match']) == 0:
+            return
+
+        rows = len(self.columns['match'])
+        for name, typecode in OUTCOME_COLUMNS:
+            with open(self.column_path(name), 'ab') as f:
+                self.columns[name].tofile(f)
+            del self.columns[name][:]
+        self.rows += rows
+
+
+    # Number of rows with every buffered row written, which a checkpoint can truncate back to.
+    def size(self) -> int:
+        self.flush()
+        return self.rows
+
+
+    def truncate(self, rows: int) -> None:
+        for name, typecode in OUTCOME_COLUMNS:
+            del self.columns[name][:]
+            with open(self.column_path(name), 'ab') as f:
+                f.truncate(rows * array.array(typecode).itemsize)
+        self.rows = rows
+
+
+    def close(self) -> None:
+        self.flush()
+
+
+    def read_column(self, name: str):
+        typecode = dict(OUTCOME_COLUMNS)[name]
+        if numpy is not None:
+            return numpy.fromfile(self.column_path(name), dtype=numpy.dtype(typecode), count=self.rows)
+
+        column = array.array(typecode)
+        with open(self.column_path(name), 'rb') as f:
+            column.fromfile(f, self.rows)
+        return column
+
+
+    @staticmethod
+    def parse_condition(condition: str) -> tuple[str, str, int]:
+        for operator in OUTCOME_OPERATORS:
+            name, found, value = condition.partition(operator)
+            if found:
+                if name.strip() not in dict(OUTCOME_COLUMNS):
+                    raise ValueError('unknown column {}'.format(name))
+                return name.strip(), operator, int(value)
+        raise ValueError('invalid condition {}'.format(condition))
+
+
+    def query(self, group_by: list[str], value: str, conditions: list[tuple[str, str, int]] = []) -> list[tuple]:
+        """Group rows matching all conditions by the group_by columns, and average the value column of every group.
+
+        Returns:
+            Rows of (group values..., number of rows, mean of value), ordered by group values.
+        """
+        self.flush()
+        if numpy is not None:
+            return self.query_numpy(group_by, value, conditions)
+
+        columns = {name: self.read_column(name) for name in set(group_by) | {value} | {name for name, operator, limit in conditions}}
+        tests = {
+            '=': lambda x, y: x == y, '!=': lambda x, y: x != y, '<': lambda x, y: x < y,
+            '<=': lambda x, y: x <= y, '>': lambda x, y: x > y, '>=': lambda x, y: x >= y,
+        }
+
+        groups: dict[tuple, list] = {}
+        for i in range(self.rows):
+            if not all(tests[operator](columns[name][i], limit) for name, operator, limit in conditions):
+                continue
+            group = groups.setdefault(tuple(columns[name][i] for name in group_by), [0, 0])
+            group[0] += 1
+            group[1] += columns[value][i]
+
+        return [key + (count, total / count) for key, (count, total) in sorted(groups.items())]
+
+
+    def query_numpy(self, group_by: list[str], value: str, conditions: list[tuple[str, str, int]]) -> list[tuple]:
+        tests = {
+            '=': numpy.equal, '!=': numpy.not_equal, '<': numpy.less,
+            '<=': numpy.less_equal, '>': numpy.greater, '>=': numpy.greater_equal,
+        }
+        mask = numpy.ones(self.rows, dtype=bool)
+        for name, operator, limit in conditions:
+            mask &= tests[operator](self.read_column(name), limit)
+
+        # Combine group columns into one key per row, then count and sum every key at once.
+        key = numpy.zeros(int(mask.sum()), dtype=numpy.int64)
+        sizes = []
+        for name in group_by:
+            column = self.read_column(name)[mask].astype(numpy.int64)
+            size = int(column.max()) + 1 if len(column) > 0 else 1
+            key = key * size + column
+            sizes.append(size)
+
+        values = self.read_column(value)[mask].astype(numpy.float64)
+        counts = numpy.bincount(key, minlength=1)
+        totals = numpy.bincount(key, weights=values, minlength=1)
+
+        result = []
+        for combined in numpy.nonzero(counts)[0]:
+            group = []
+            rest = int(combined)
+            for size in reversed(sizes):
+                rest, group_value = divmod(rest, size)
+                group.append(group_value)
+            result.append(tuple(reversed(group)) + (int(counts[combined]), float(totals[combined] / counts[combined])))
+        return result
+
+
+    @staticmethod
+    def format_value(name: str, value: int) -> str:
+        if name == 'hand_class':
+            return OutcomeStore.class_name(value)
+        if name == 'rank':
+            return 'Not ranked' if value == OUTCOME_NONE else RANK_NAMES[value]
+        if name.startswith('hole') or name.startswith('board'):
+            return '-' if value == OUTCOME_NONE else ''.join(HandHistory.encode_cards([Deck.index_card(value)]))
+        return str(value)
+
+
+class Game():
+    '''The class represents gaming system for Texas Holdem.
+    
+    Attributes:
+        deck: Stimulated deck for game
+        bet_pool: Total amount bet in bet pool for this game
+        number_of_round: Number of rounds passed
+        community_cards: Community card ist for this round
+        human_player: object for HumanPlayer class
+        bot_player: List of objects for BotPlayer class.
+        all_players:List of objects for all Players.
+        match_count: Number of matches dealt
+        actions: Actions taken in this match, as [round, player id, action, bets]
+        hand_history: Hand-history log the matches are recorded to, or None
+        sampling: Sampling strategy of Trainer.estimate used to train bots, or None for Trainer.train
+        observed_bets: Total bets of every player in this match, which give the opponents' ranges
+        flop_table: Flop equity table bots look up on the flop instead of training, or None
+        hand_memo: Memo of hand ranks shared by all cases of file mode, or None
+        number_of_train: Number of deals bots are trained with before an action
+        round_budget: Seconds all bots share to estimate their equity in a round, or None to train with number_of_train deals
+        outcome_store: Columnar store the outcome of every player is recorded to, or None
+        match_stacks: Stacks of all players when this match was dealt
+        '''
+    def __init__(self):
+        self.deck = Deck()
+        self.bet_pool = 0
+        self.number_of_round = 0
+        self.community_cards: list[Card] = []
+        self.human_player = HumanPlayer('0')
+        self.bot_players: list[BotPlayer] = []
+        self.all_players: list[Player] = []
+        self.match_count = 0
+        self.actions: list[list] = []
+        self.hand_history: HandHistory = None
+        self.sampling: str = None
+        self.observed_bets: dict[str, int] = {}
+        self.flop_table: FlopTable = None
+        self.hand_memo: HandMemo = None
+        self.number_of_train = NUMBER_OF_TRAIN
+        self.round_budget: float = None
+        self.outcome_store: OutcomeStore = None
+        self.match_stacks: list[int] = []
+
+
+    def init_players(self, number_of_players: int) -> None:
+        self.human_player.set_initial_bet(INITIAL_BET)
+
+        for i in range(1, number_of_players + 1):
+            player = BotPlayer(str(i))
+            player.set_initial_bet(INITIAL_BET)
+            self.bot_players.append(player)
+
+        self.all_players.append(self.human_player)
+        self.all_players += self.bot_players
+
+
+    def clear_players(self) -> None:
+        self.bot_players.clear()
+        self.all_players.clear()
+        
+
+    def reset_cards(self):
+        self.bet_pool = 0
+        self.number_of_round = 0
+        self.community_cards.clear()
+        self.actions = []
+        self.observed_bets = {}
+
+        for player in self.all_players:
+            player.reset_cards()
+
+
+    def deal_cards(self) -> None:
+        if self.number_of_round == 0:
+            self.match_count += 1
+            self.deck.shuffle()
+            self.community_cards.clear()
+            self.match_stacks = [player.bet_amount for player in self.all_players]
+
+            LOGGER.info('deal', '------Initialization--------')
+            for player in self.all_players:
+                player.set_initial_cards(self.deck.deal(2))
+
+            Game.print_cards('Human Player: ', self.human_player.initial_cards)
+        elif self.number_of_round == 1:
+            LOGGER.info('deal', '---------Round 1-----------')
+            self.community_cards += self.deck.deal(3)
+            for player in self.all_players:
+                player.set_community_cards(self.community_cards)
+
+            Game.print_cards('Community cards: ', self.community_cards)
+        elif self.number_of_round == 2:
+            LOGGER.info('deal', '---------Round 2-----------')
+            self.community_cards += self.deck.deal(2)
+            for player in self.all_players:
+                player.set_community_cards(self.community_cards)
+
+            Game.print_cards('Community cards: ', self.community_cards[3:])
+
+
+    # Run user mode
+    def run_user_mode(self, number_of_players: int) -> None:
+        self.init_players(number_of_players)
+        while True:
+            LOGGER.info('match', '\n------Match {}--------\n', self.match_count + 1)
 
             self.deal_cards()
 
@@ -695,73 +3410,319 @@ class Game():
                 self.deal_cards()
 
             result_msg = self.check_result()
-            print('---------Results-----------')
-            print(result_msg)
+            LOGGER.info('result', '---------Results-----------')
+            LOGGER.info('result', result_msg)
             self.print_detail()
         
             self.reset_cards()
 
-            if self.human_player.is_fold():
-                print('The game ends, since the human player is out of money.')
-                break
+            if self.human_player.is_fold():
+                LOGGER.info('end', 'The game ends, since the human player is out of money.')
+                break
+
+            has_bot_player = False
+            for player in self.bot_players:
+                if not player.is_fold():
+                    has_bot_player = True
+                    break
+
+            if not has_bot_player:
+                LOGGER.info('end', 'The game ends, since the bot player is out of money.')
+                break
+
+            if Game.input_choice() == 'n':
+                break
+
+        self.close_records()
+        LOGGER.info('end', '------End of Game--------')
+        LOGGER.flush()
+
+
+    # Run file mode. Cases are read and judged one by one, and with a cache only new or changed cases are judged.
+    def run_file_mode(self, dir_path: str, cache_path: str = None, checkpoint: Checkpoint = None, sink: ResultSink = None, fail_fast: int = None) -> None:
+        """Judge every test case of the directory and print the failed ones. With a sink, every result is also
+        streamed to it, and with fail_fast, the run stops after that many failed or unreadable cases.
+        """
+        cache = None
+        if cache_path is not None:
+            cache = VerdictCache(cache_path)
+
+        number_of_cases = 0
+        number_of_passed = 0
+        number_of_failures = 0     # Failed or unreadable cases of this run, which fail_fast counts
+        cursor = 0
+
+        state = checkpoint.load() if checkpoint is not None else None
+        if state is not None:
+            cursor, number_of_cases, number_of_passed = state['cursor'], state['cases'], state['passed']
+            if cache is not None:
+                cache.used.update(cache.verdicts)     # The cache was saved with the checkpoint
+            LOGGER.info('checkpoint', 'Resuming after {} test cases.', cursor)
+        if sink is not None:
+            sink.restore(state.get('results') if state is not None else None)
+
+        def save_checkpoint():
+            if cache is not None:
+                cache.save()
+            checkpoint.save({'cursor': cursor, 'cases': number_of_cases, 'passed': number_of_passed,
+                'results': sink.state() if sink is not None else None})
+
+        try:
+            test_case_list = list(TestCases.read_results(dir_path))
+        except (OSError, csv.Error):
+            print('There is an error while reading test cases directory \'{}\'.'.format(dir_path))
+            return
+
+        stopped = False
+        for test_case_file, winner in test_case_list[cursor:]:
+            if checkpoint is not None and checkpoint.is_due():
+                save_checkpoint()
+            cursor += 1
+
+            start_time = time.perf_counter()
+            try:
+                result = self.judge_file(test_case_file, winner, cache)
+            except Exception:       # A broken case is reported on its own, the run goes on
+                message = 'There is an error while reading \'{}\'.'.format(test_case_file)
+                print(message)
+                if sink is not None:
+                    sink.add_error(test_case_file, winner, message, time.perf_counter() - start_time)
+                number_of_failures += 1
+            else:
+                seconds = time.perf_counter() - start_time
+                METRICS.observe('judge', seconds)
+                if sink is not None:
+                    sink.add(result, seconds)
+
+                number_of_cases += 1
+                METRICS.count('cases')
+                if result.passed:
+                    number_of_passed += 1
+                else:
+                    METRICS.count('cases_failed')
+                    number_of_failures += 1
+                    print(Game.result_message(result))
+
+            if fail_fast is not None and number_of_failures >= fail_fast:
+                stopped = True
+                break
+
+        if stopped:
+            print('Stopped after {} failed test cases.'.format(number_of_failures))
+        if checkpoint is not None and stopped:
+            save_checkpoint()       # Resuming goes on after the failures
+        elif checkpoint is not None:
+            checkpoint.remove()
+        if cache is not None:
+            cache.save()
+
+        if self.hand_memo is not None:
+            number_of_ranks = self.hand_memo.hits + self.hand_memo.misses
+            print('There are {} of {} hand evaluations avoided.'.format(self.hand_memo.hits, number_of_ranks))
+
+        print('There are {} tests passed.'.format(number_of_passed))
+
+
+    def judge_file(self, test_case_file: str, winner: str, cache: VerdictCache = None) -> CaseResult:
+        if cache is None:
+            return self.judge_case(TestCases.read_case(test_case_file, winner))
+
+        key = VerdictCache.key(test_case_file, winner)
+        result = cache.get(key, test_case_file, winner)
+        if result is None:
+            METRICS.count('verdict_misses')
+            result = self.judge_case(TestCases.read_case(test_case_file, winner))
+            cache.put(key, result)
+        else:
+            METRICS.count('verdict_hits')
+
+        return result
+
+
+    def judge_case(self, test_case: TestCase) -> CaseResult:
+        self.init_players(len(test_case.players)-1)
+
+        for player, test_player in zip(self.all_players, test_case.players):
+            player.reset_cards()
+            player.set_initial_cards(list(test_player[1]))
+            if self.hand_memo is not None:
+                self.hand_memo.rank(player)
+            else:
+                player.check_rank()
+
+        winner_list = self.get_winner()
+        winners = [player.id for player in winner_list]
+        ranks = [[player.id, player.rank] for player in self.all_players]
+        if len(winner_list) > 1:
+            passed = not test_case.winner       # Check whether the game is tied.
+        else:
+            passed = winner_list[0].id == test_case.winner      # Check whether the winner is the same as expected.
+
+        self.clear_players()
+        return CaseResult(test_case.name, test_case.winner, winners, passed, ranks)
+
+
+    def judge_chunk(self, dir_path: str, test_cases: list) -> tuple[int, int, list[str]]:
+        """Judge the test cases of a chunk of a coordinated file mode run, given as (test case file, expected winner)
+        by the coordinator, so test_results.txt is only read once.
+
+        Returns:
+            The number of cases judged and passed, and the message of every failed or unreadable case.
+        """
+        os.chdir(Path(dir_path))    # Test case files are relative to the test cases directory
+        number_of_cases = 0
+        number_of_passed = 0
+        messages = []
+        for test_case_file, winner in test_cases:
+            start_time = time.perf_counter()
+            try:
+                result = self.judge_file(test_case_file, winner)
+            except Exception:
+                messages.append('There is an error while reading \'{}\'.'.format(test_case_file))
+                continue
+            METRICS.observe('judge', time.perf_counter() - start_time)
+
+            number_of_cases += 1
+            METRICS.count('cases')
+            if result.passed:
+                number_of_passed += 1
+            else:
+                METRICS.count('cases_failed')
+                messages.append(Game.result_message(result))
+        return number_of_cases, number_of_passed, messages
+
+
+    @staticmethod
+    def result_message(result: CaseResult) -> str:
+        if len(result.winners) > 1:
+            return 'Test case {} is incorrect, the game is tied, while expected winner is {}'.format(result.name, result.winner)
+        return 'Test case {} is incorrect, winner {} != except winner {}.'.format(result.name, result.winners[0], result.winner)
+
+
+    # Run replay mode
+    def run_replay_mode(self, history_path: str) -> None:
+        """Re-rank every recorded showdown and verify it against the recorded winners.
+        """
+        number_of_hands = 0
+        number_of_verified = 0
+
+        try:
+            for record in HandHistory.read(history_path):
+                number_of_hands += 1
+                board = HandHistory.decode_cards(record['board'])
+                folded = set(record['folded'])
+
+                for id, cards_str in record['players']:
+                    player = Player(id)
+                    if id not in folded:
+                        player.state = ACTION_BET
+                    player.set_initial_cards(HandHistory.decode_cards(cards_str))
+                    player.set_community_cards(board)
+                    if len(player.initial_cards) + len(board) >= 5:
+                        player.check_rank()
+                    self.all_players.append(player)
+
+                winners = [player.id for player in self.get_winner()]
+                if winners == record['winners']:
+                    number_of_verified += 1
+                else:
+                    print('Match {} is incorrect, winner {} != recorded winner {}.'.format(record['match'], winners, record['winners']))
+
+                self.all_players.clear()
+        except (OSError, ValueError, KeyError):
+            print('There is an error while reading hand history \'{}\'.'.format(history_path))
+
+        print('There are {} hands replayed, {} verified.'.format(number_of_hands, number_of_verified))
+
+
+    def train_players(self) -> None:
+        start_time = time.perf_counter()
+        try:
+            self.count_opponents()
+            if BotPlayer.policy_path is not None:     # Bots decide by policy without training
+                return
+
+            if self.flop_table is not None and len(self.community_cards) == 3 and self.lookup_players():
+                METRICS.count('flop_lookups')
+                return
+
+            if self.round_budget is not None:
+                self.schedule_players()
+                return
+
+            if self.sampling is not None:
+                self.estimate_players()
+                return
+
+            trainer = Trainer(len(self.bot_players))
+
+            for i in range(self.number_of_train):
+                train_case = trainer.train(self.community_cards)
+                for player in self.bot_players:
+                    player.train(train_case)
+            METRICS.count('samples', self.number_of_train)
+        finally:
+            METRICS.observe('train', time.perf_counter() - start_time)
+
+
+    # Ranges of the players still in the match besides player, which only narrow with a sampling strategy.
+    def opponent_ranges(self, player: Player) -> list:
+        ranges = []
+        for other in self.all_players:
+            if other is not player and not other.is_fold():
+                ranges.append(HandRange.from_bets(self.observed_bets.get(other.id, 0)) if self.sampling is not None else None)
 
-            has_bot_player = False
-            for player in self.bot_players:
-                if not player.is_fold():
-                    has_bot_player = True
-                    break
+        if len(ranges) == 0:
+            ranges.append(None)
+        return ranges
 
-            if not has_bot_player:
-                print('The game ends, since the bot player is out of money.')
-                break
 
-            if Game.input_choice() == 'n':
-                break
+    # Train bots with equity against the ranges of players still in the match.
+    def estimate_players(self) -> None:
+        for player in self.bot_players:
+            if not player.is_betting():
+                continue
 
-        print('------End of Game--------')
+            ranges = self.opponent_ranges(player)
+            trainer = Trainer(len(ranges))
+            equity = trainer.estimate(player.initial_cards, self.community_cards, self.number_of_train, self.sampling, ranges)
+            player.number_of_train = equity.samples
+            player.number_of_train_win = round(equity.ratio * equity.samples)
+            player.train_stderr = equity.stderr
+            LOGGER.debug('bot_equity', "Bot Player {}: equity {:.4f} +- {:.4f} with {} deals.", player.id, equity.ratio, equity.stderr, equity.samples)
 
 
-    # Run file mode
-    def run_file_mode(self, dir_path: str) -> None:
-        try:
-            test_cases = TestCases()
-            test_cases.read_from_directory(dir_path)
-        except:
-            print('There is an error while reading test cases directory \'{}\'.'.format(dir_path))
-            return
+    # Train bots with equities estimated within round_budget, shared by all bots.
+    def schedule_players(self) -> None:
+        scheduler = DeadlineScheduler(self.round_budget, self.sampling)
+        for player in self.bot_players:
+            if player.is_betting():
+                scheduler.add(player, self.opponent_ranges(player))
+        scheduler.run()
 
-        number_of_passed = 0
 
-        for test_case in test_cases.cases:
-            self.init_players(len(test_case.players)-1)
+    def count_opponents(self) -> None:
+        for player in self.bot_players:
+            player.number_of_opponents = 0
+            for other in self.all_players:
+                if other is not player and not other.is_fold():
+                    player.number_of_opponents += 1
 
-            for player, test_player in zip(self.all_players, test_case.players):
-                player.set_initial_cards(test_player[1])
-                player.check_rank()
-            
-            winner_list = self.get_winner()
-            if len(winner_list) > 1:
-                if not test_case.winner:       # Check whether the game is tied.
-                    number_of_passed += 1
-                else:
-                    print('Test case {} is incorrect, the game is tied, while expected winner is {}'.format(test_case.name, test_case.winner))
-            elif winner_list[0].id == test_case.winner:      # Check whether the winner is the same as expected.
-                number_of_passed += 1
-            else:
-                print('Test case {} is incorrect, winner {} != except winner {}.'.format(test_case.name, winner_list[0].id, test_case.winner))
-            
-            self.clear_players()
 
-        print('There are {} tests passed.'.format(number_of_passed))
+    # Train bots with the flop table. Return False if a bot has no entry in it.
+    def lookup_players(self) -> bool:
+        for player in self.bot_players:
+            if not player.is_betting():
+                continue
 
+            ratio = self.flop_table.lookup(player.initial_cards, self.community_cards, max(1, player.number_of_opponents))
+            if ratio is None:
+                return False
 
-    def train_players(self) -> None:
-        trainer = Trainer(len(self.bot_players))
+            player.number_of_train = FLOP_TABLE_SCALE
+            player.number_of_train_win = round(ratio * FLOP_TABLE_SCALE)
 
-        for i in range(NUMBER_OF_TRAIN):
-            train_case = trainer.train(self.community_cards)
-            for player in self.bot_players:
-                player.train(train_case)
+        return True
 
 
     def play_a_round(self) -> bool:
@@ -774,6 +3735,7 @@ class Game():
 
         for player in self.all_players:
             action, bets = player.make_action(limp_bets)
+            self.record_action(player, action, bets)
             if action == ACTION_BET:
                 self.bet_pool += bets
                 if limp_bets < bets:
@@ -806,9 +3768,61 @@ class Game():
         self.bet_pool = 0
 
 
+    def record_action(self, player: Player, action: str, bets: int) -> None:
+        if action == ACTION_BET:
+            self.observed_bets[player.id] = self.observed_bets.get(player.id, 0) + bets
+
+        if self.hand_history is not None:
+            self.actions.append([self.number_of_round, player.id, action, bets])
+
+
+    def record_match(self, winner_list: list[Player]) -> None:
+        """Add the dealt cards, actions and showdown result of this match to hand history.
+        """
+        if self.hand_history is None:
+            return
+
+        self.hand_history.add({
+            'match': self.match_count,
+            'players': [[player.id, HandHistory.encode_cards(player.initial_cards)] for player in self.all_players],
+            'board': HandHistory.encode_cards(self.community_cards),
+            'folded': [player.id for player in self.all_players if player.is_fold()],
+            'actions': self.actions,
+            'pool': self.bet_pool,
+            'winners': [player.id for player in winner_list],
+        })
+
+
+    # Record the outcome of every player, given the stacks before the bet pool was distributed.
+    def record_outcomes(self, winner_list: list[Player], stacks: list[int]) -> None:
+        if self.outcome_store is None:
+            return
+
+        bets = [match_stack - stack for match_stack, stack in zip(self.match_stacks, stacks)]
+        payouts = [player.bet_amount - match_stack for player, match_stack in zip(self.all_players, self.match_stacks)]
+        self.outcome_store.add_match(self.match_count, self.all_players, self.community_cards, winner_list, bets, payouts)
+
+
+    def close_history(self) -> None:
+        if self.hand_history is not None:
+            self.hand_history.close()
+            self.hand_history = None
+
+
+    # Close the hand history and the outcome store.
+    def close_records(self) -> None:
+        self.close_history()
+        if self.outcome_store is not None:
+            self.outcome_store.close()
+            self.outcome_store = None
+
+
     def check_result(self) -> str:
         winner_list = self.get_winner()
+        self.record_match(winner_list)
+        stacks = [player.bet_amount for player in self.all_players]
         self.distribute_bet_pool(winner_list)
+        self.record_outcomes(winner_list, stacks)
 
         number_of_winner = len(winner_list)
         if number_of_winner > 1:
@@ -832,30 +3846,24 @@ class Game():
 
     def print_detail(self):
         if TEST_MODE:
-            self.human_player.check_rank()
-            if self.human_player.is_fold():
-                print('[X] ', end='')
-            else:
-                print('    ', end='')
+            if not LOGGER.is_enabled(LOG_DEBUG):
+                return
 
-            print('Human Player: ${}, rank {} = {}.'.format(self.human_player.bet_amount, self.human_player.rank, self.human_player.rank_str()), end='')
-            Game.print_player_cards(' ', self.human_player)
+            self.human_player.check_rank()
+            LOGGER.debug('detail', '{}Human Player: ${}, rank {} = {}. {}', '[X] ' if self.human_player.is_fold() else '    ',
+                self.human_player.bet_amount, self.human_player.rank, self.human_player.rank_str(), Game.cards_str(self.human_player.initial_cards + self.human_player.community_cards))
 
             for player in self.bot_players:
                 player.check_rank()
-                if player.is_fold():
-                    print('[X] ', end='')
-                else:
-                    print('    ', end='')
-
-                print('Bot Player {}: ${}, rank {} = {}.'.format(player.id, player.bet_amount, player.rank, player.rank_str()), end='')
-                Game.print_player_cards(' ', player)
+                LOGGER.debug('detail', '{}Bot Player {}: ${}, rank {} = {}. {}', '[X] ' if player.is_fold() else '    ',
+                    player.id, player.bet_amount, player.rank, player.rank_str(), Game.cards_str(player.initial_cards + player.community_cards))
+            LOGGER.debug('detail', '')
         else:
-            print('Human Player: ${}'.format(self.human_player.bet_amount))
+            LOGGER.info('detail', 'Human Player: ${}', self.human_player.bet_amount)
 
             for player in self.bot_players:
-                print('Bot Player {}: ${}'.format(player.id, player.bet_amount))
-        print('')
+                LOGGER.info('detail', 'Bot Player {}: ${}', player.id, player.bet_amount)
+            LOGGER.info('detail', '')
 
 
     def get_winner(self) -> list[Player]:
@@ -883,29 +3891,24 @@ class Game():
 
     @staticmethod
     def print_player_cards(prefix: str, player: Player) -> None:
-        print(prefix, end='')
-
-        for card in player.initial_cards:
-            print(' {}{}'.format(card.suit, card.value), end='')
-
-        for card in player.community_cards:
-            print(' {}{}'.format(card.suit, card.value), end='')
-
-        print('')
+        if LOGGER.is_enabled(LOG_INFO):
+            LOGGER.info('cards', '{}{}', prefix, Game.cards_str(player.initial_cards + player.community_cards))
 
 
     @staticmethod
     def print_cards(prefix: str, cards1: list[Card]) -> None:
-        print(prefix, end='')
+        if LOGGER.is_enabled(LOG_INFO):
+            LOGGER.info('cards', '{}{}', prefix, Game.cards_str(cards1))
 
-        for card in cards1:
-            print(' {}{}'.format(card.suit, card.value), end='')
 
-        print('')
+    @staticmethod
+    def cards_str(cards: list[Card]) -> str:
+        return ''.join([' {}{}'.format(card.suit, card.value) for card in cards])
 
 
     @staticmethod
     def input_choice():
+        LOGGER.flush()
         while True:
             continue_choice = input("Do you want to continue gaming? Type 'y' for yes and 'n' for no:")
             if continue_choice == 'Y' or continue_choice == 'y':
@@ -915,6 +3918,532 @@ class Game():
             print('Invalid input. Please re-enter your choice.')
 
 
+class BotGame(Game):
+    '''The class represents a game played by bots only, for headless matches. Seat 0 is a bot as well.
+    An observer, if set, is called after every action.
+    '''
+    def __init__(self):
+        Game.__init__(self)
+        self.human_player = BotPlayer('0')
+        self.observer = None
+
+
+    def record_action(self, player: Player, action: str, bets: int) -> None:
+        Game.record_action(self, player, action, bets)
+        if self.observer is not None:
+            self.observer()
+
+
+    def init_players(self, number_of_players: int) -> None:
+        Game.init_players(self, number_of_players)
+        self.bot_players.insert(0, self.human_player)
+
+
+    def play_a_match(self) -> list[Player]:
+        """Play a match through rounds, and distribute bet pool to winners.
+
+        Returns:
+            The winner list.
+        """
+        self.deal_cards()
+        while self.play_a_round():
+            self.deal_cards()
+
+        winner_list = self.get_winner()
+        self.check_result()
+        self.reset_cards()
+        return winner_list
+
+
+    def run_simulation_mode(self, number_of_players: int, number_of_matches: int, seed: int = 0, checkpoint: Checkpoint = None) -> None:
+        """Play matches of bots in every seat, each from a fresh stack, and print the average winnings of every seat.
+        Every match is seeded from the seed and its number, so with the winnings, the match count and the order of
+        the deck, which is shuffled from its last order, a checkpoint resumes with the same results.
+        """
+        totals = [0] * number_of_players
+        first_match = 0
+
+        state = checkpoint.load() if checkpoint is not None else None
+        if state is not None:
+            first_match, totals, self.match_count = state['match'], state['totals'], state['match_count']
+            self.deck.cards = HandHistory.decode_cards(state['deck'])
+            if self.hand_history is not None:
+                self.hand_history.truncate(state['history_size'])
+            if self.outcome_store is not None:
+                self.outcome_store.truncate(state['outcome_rows'])
+            LOGGER.info('checkpoint', 'Resuming from match {}.', first_match)
+
+        for match in range(first_match, number_of_matches):
+            if checkpoint is not None and checkpoint.is_due():
+                history_size = self.hand_history.size() if self.hand_history is not None else 0
+                outcome_rows = self.outcome_store.size() if self.outcome_store is not None else 0
+                checkpoint.save({'match': match, 'totals': totals, 'match_count': self.match_count,
+                    'deck': HandHistory.encode_cards(self.deck.cards), 'history_size': history_size, 'outcome_rows': outcome_rows})
+
+            random.seed('{}-{}'.format(seed, match))
+            self.init_players(number_of_players - 1)
+
+            start_time = time.perf_counter()
+            self.play_a_match()
+            METRICS.observe('match', time.perf_counter() - start_time)
+            METRICS.count('matches')
+
+            for i, player in enumerate(self.all_players):
+                totals[i] += player.bet_amount - INITIAL_BET
+            self.clear_players()
+
+            if (match + 1) % SIMULATION_REPORT == 0:
+                LOGGER.info('simulate', 'Simulation: {} of {} matches played.', match + 1, number_of_matches)
+
+        if checkpoint is not None:
+            checkpoint.remove()
+
+        for i, total in enumerate(totals):
+            LOGGER.info('simulate', 'Seat {}: ${:.4f} per match.', i, total / number_of_matches)
+
+
+    # Play the matches of a chunk of a coordinated simulation from a new deck, so a chunk gives the same
+    # winnings on any worker.
+    def play_chunk(self, number_of_players: int, first_match: int, last_match: int, seed: int) -> list[int]:
+        totals = [0] * number_of_players
+        self.deck = Deck()
+        for match in range(first_match, last_match):
+            random.seed('{}-{}'.format(seed, match))
+            self.init_players(number_of_players - 1)
+
+            start_time = time.perf_counter()
+            self.play_a_match()
+            METRICS.observe('match', time.perf_counter() - start_time)
+            METRICS.count('matches')
+
+            for i, player in enumerate(self.all_players):
+                totals[i] += player.bet_amount - INITIAL_BET
+            self.clear_players()
+        return totals
+
+
+class StrategyTuner:
+    '''This class searches for a better SUCC_RATIO_ACTION_TABLE offline.
+    A candidate table is played by one bot against bots with the base table, in matches from fresh stacks.
+    Every candidate is scored with the same seeds (common random numbers), so candidates are compared on the same deals.
+    Candidates are scored in a pool of worker processes.
+
+    Attributes:
+        number_of_players: Number of bots in a match
+        number_of_matches: Number of matches every candidate is scored with
+        number_of_train: Number of deals bots are trained with
+        seed: Seed of the search and of the matches
+    '''
+    def __init__(self, number_of_players: int, number_of_matches: int = TUNE_MATCHES, number_of_train: int = TUNE_TRAIN, seed: int = 0):
+        self.number_of_players = number_of_players
+        self.number_of_matches = number_of_matches
+        self.number_of_train = number_of_train
+        self.seed = seed
+        self.rng = random.Random(seed)
+
+
+    def tune(self, search: str, workers: int = None) -> tuple[list[tuple], float]:
+        """Search for the table with the best score.
+
+        Returns:
+            The best table and its score, the average winning amount per match.
+        """
+        shared_cache_path = SHARED_CACHE.path if SHARED_CACHE is not None else None
+        with multiprocessing.Pool(workers, initializer=StrategyTuner.init_worker, initargs=(shared_cache_path,)) as pool:
+            if search == 'grid':
+                candidates = self.grid_tables()
+            else:
+                candidates = [SUCC_RATIO_ACTION_TABLE] + [self.random_table() for i in range(TUNE_CANDIDATES - 1)]
+
+            scored = self.score_tables(pool, candidates)
+            if search == 'evolve':
+                for generation in range(1, TUNE_GENERATIONS):
+                    parents = [table for score, table in scored[:len(scored) // 2]]
+                    children = [self.mutate_table(self.rng.choice(parents)) for i in range(TUNE_CANDIDATES - len(parents))]
+                    scored = sorted(scored[:len(parents)] + self.score_tables(pool, children), key=lambda item: item[0], reverse=True)
+                    LOGGER.info('tune', 'Tuner: generation {}, best score {:.4f}.', generation, scored[0][0])
+
+        return scored[0][1], scored[0][0]
+
+
+    # Matches of workers are not printed.
+    @staticmethod
+    def init_worker(shared_cache_path: str) -> None:
+        LOGGER.level = max(LOGGER.level, LOG_WARNING)
+        SharedCache.init_worker(shared_cache_path)
+
+
+    def score_tables(self, pool, candidates: list[list[tuple]]) -> list[tuple[float, list[tuple]]]:
+        tasks = [(table, self.number_of_players, self.number_of_matches, self.number_of_train, self.seed) for table in candidates]
+        scores = pool.map(StrategyTuner.score_table, tasks)
+        return sorted(zip(scores, candidates), key=lambda item: item[0], reverse=True)
+
+
+    @staticmethod
+    def score_table(task: tuple) -> float:
+        """Play matches of the candidate table against the base table. The candidate takes turns in the seats.
+
+        Returns:
+            Average amount the candidate wins per match.
+        """
+        table, number_of_players, number_of_matches, number_of_train, seed = task
+        total = 0
+        for match in range(number_of_matches):
+            random.seed('{}-{}'.format(seed, match))
+            game = BotGame()
+            game.number_of_train = number_of_train
+            game.init_players(number_of_players - 1)
+
+            candidate = game.all_players[match % number_of_players]
+            candidate.action_table = table
+            game.play_a_match()
+            total += candidate.bet_amount - INITIAL_BET
+
+        return total / number_of_matches
+
+
+    # Vary fold grade and scale bet amounts of the base table.
+    def grid_tables(self) -> list[list[tuple]]:
+        tables = []
+        for fold_grade in (0.3, 0.35, 0.4, 0.45, 0.5):
+            for scale in (0.5, 1.0, 1.5, 2.0):
+                table = [(fold_grade, ACTION_FOLD, 0, 0)]
+                for grade, action, floor, ceiling in SUCC_RATIO_ACTION_TABLE[1:]:
+                    table.append((grade, action, min(round(floor * scale), INITIAL_BET), min(round(ceiling * scale), INITIAL_BET)))
+                tables.append(StrategyTuner.fix_table(table))
+        return tables
+
+
+    def random_table(self) -> list[tuple]:
+        grades = sorted([round(self.rng.uniform(0.2, 0.95), 3) for i in range(3)])
+        table = [(grades[0], ACTION_FOLD, 0, 0)]
+        for grade in grades[1:] + [1.0]:
+            bets = sorted([self.rng.randint(1, INITIAL_BET), self.rng.randint(1, INITIAL_BET)])
+            table.append((grade, ACTION_BET, bets[0], bets[1]))
+        return StrategyTuner.fix_table(table)
+
+
+    def mutate_table(self, table: list[tuple]) -> list[tuple]:
+        mutated = []
+        for grade, action, floor, ceiling in table:
+            if grade < 1.0:
+                grade = round(min(0.99, max(0.01, grade + self.rng.gauss(0, 0.05))), 3)
+            if action == ACTION_BET:
+                floor = min(INITIAL_BET, max(1, floor + self.rng.choice((-1, 0, 1))))
+                ceiling = min(INITIAL_BET, max(floor, ceiling + self.rng.choice((-1, 0, 1))))
+            mutated.append((grade, action, floor, ceiling))
+        return StrategyTuner.fix_table(mutated)
+
+
+    # Keep grades increasing and every floor not greater than its ceiling.
+    @staticmethod
+    def fix_table(table: list[tuple]) -> list[tuple]:
+        grades = sorted([action_item[0] for action_item in table])
+        return [(grade, action, min(floor, ceiling), max(floor, ceiling)) for grade, (old_grade, action, floor, ceiling) in zip(grades, table)]
+
+
+# coordinator and workers over TCP
+class Coordinator:
+    '''This class hands out chunks of a simulation or file mode run over TCP to any number of RemoteWorker processes,
+    on this host or others, and adds up their results. Messages are JSON lines. A chunk is handed to another worker
+    when its worker disconnects, refuses it or takes longer than the timeout, and a late result of a chunk already
+    done is ignored. Chunks are seeded by their matches, so the results do not depend on which worker plays them.
+
+    Attributes:
+        address: Host and port the coordinator listens on, the port is the bound one once it listens
+        job: Parameters of the run every chunk is sent with
+        items: Items of every chunk sent with it, like the test cases of file mode, or None
+        chunks: First and last item of every chunk
+        pending: Indexes of chunks not handed out, or handed back by a lost worker
+        results: Result of every finished chunk by index
+        timeout: Most seconds a worker may take for a chunk
+        listening: Set once the coordinator listens on address
+    '''
+    def __init__(self, address: tuple[str, int], job: dict, number_of_items: int, chunk: int = COORDINATOR_CHUNK, timeout: float = COORDINATOR_TIMEOUT, items: list = None):
+        self.address = address
+        self.job = job
+        self.items = items
+        self.chunks = [(first, min(first + chunk, number_of_items)) for first in range(0, number_of_items, chunk)]
+        self.pending = collections.deque(range(len(self.chunks)))
+        self.results: dict[int, dict] = {}
+        self.timeout = timeout
+        self.condition = threading.Condition()
+        self.listening = threading.Event()
+
+
+    @staticmethod
+    def simulation_job(number_of_players: int, seed: int, sampling: str = None, round_budget: float = None, number_of_train: int = NUMBER_OF_TRAIN, flop_table: str = None, policy: str = None) -> dict:
+        """Parameters of a coordinated simulation. Workers play with the action table and number of deals of the
+        job, and refuse its chunks if their flop table or policy file is not the coordinator's, so results never
+        mix different bots.
+        """
+        return {'mode': 'simulation', 'players': number_of_players, 'seed': seed, 'sampling': sampling, 'round_budget': round_budget,
+            'number_of_train': number_of_train, 'table': [list(action_item) for action_item in BotPlayer.action_table],
+            'flop_table': Coordinator.file_digest(flop_table), 'policy': Coordinator.file_digest(policy)}
+
+
+    @staticmethod
+    def file_digest(path: str) -> str:
+        if not path:
+            return None
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+
+    @staticmethod
+    def parse_address(address: str) -> tuple[str, int]:
+        host, _, port = address.rpartition(':')
+        return host or '127.0.0.1', int(port)
+
+
+    @staticmethod
+    def send_message(stream, message: dict) -> None:
+        stream.write((json.dumps(message) + '\n').encode())
+        stream.flush()
+
+
+    @staticmethod
+    def read_message(stream) -> dict:
+        line = stream.readline()
+        if not line:
+            raise ConnectionError('connection closed')
+        return json.loads(line)
+
+
+    def run(self) -> list[dict]:
+        """Serve workers until every chunk has a result.
+
+        Returns:
+            The result of every chunk in order.
+        """
+        server = CoordinatorServer(self.address, CoordinatorHandler)
+        server.coordinator = self
+        self.address = server.server_address[:2]
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.listening.set()
+        LOGGER.info('coordinate', 'Coordinator: {} chunks on {}:{}, waiting for workers.', len(self.chunks), *self.address)
+
+        with self.condition:
+            while len(self.results) < len(self.chunks):
+                self.condition.wait()
+            self.condition.notify_all()     # Idle workers are told the run is done
+
+        server.shutdown()
+        server.server_close()
+        return [self.results[i] for i in range(len(self.chunks))]
+
+
+    # Wait for a chunk to hand out, which may be handed back by a lost worker, or None when all chunks are done.
+    def next_chunk(self) -> int:
+        with self.condition:
+            while not self.pending and len(self.results) < len(self.chunks):
+                self.condition.wait()
+            return self.pending.popleft() if self.pending else None
+
+
+    def finish_chunk(self, index: int, result: dict) -> None:
+        with self.condition:
+            if index not in self.results:
+                self.results[index] = result
+                METRICS.count('chunks')
+                LOGGER.info('coordinate', 'Coordinator: {} of {} chunks done.', len(self.results), len(self.chunks))
+            self.condition.notify_all()
+
+
+    def return_chunk(self, index: int) -> None:
+        with self.condition:
+            if index not in self.results and index not in self.pending:
+                self.pending.appendleft(index)
+                METRICS.count('chunks_reassigned')
+            self.condition.notify_all()
+
+
+    def serve(self, connection: socket.socket, reader, writer, worker: str) -> None:
+        index = None
+        try:
+            Coordinator.read_message(reader)      # The worker says it is ready
+            while True:
+                index = self.next_chunk()
+                if index is None:
+                    Coordinator.send_message(writer, {'type': 'done'})
+                    return
+
+                first, last = self.chunks[index]
+                message = {'type': 'chunk', 'index': index, 'first': first, 'last': last, 'job': self.job}
+                if self.items is not None:
+                    message['items'] = self.items[first:last]
+                Coordinator.send_message(writer, message)
+                connection.settimeout(self.timeout)
+                reply = Coordinator.read_message(reader)
+                connection.settimeout(None)
+                if reply['type'] == 'refuse':
+                    LOGGER.warning('coordinate', 'Coordinator: worker {} refused chunk {}, {}.', worker, index, reply['reason'])
+                    return
+                self.finish_chunk(index, reply['result'])
+                index = None
+        except (OSError, ValueError, KeyError) as e:
+            if index is not None:
+                LOGGER.warning('coordinate', 'Coordinator: lost worker {} ({}), chunk {} is handed out again.', worker, e, index)
+        finally:
+            if index is not None:
+                self.return_chunk(index)
+
+
+    # Add up the results of a coordinated simulation, and print them like simulation mode.
+    def run_simulation(self, number_of_players: int, number_of_matches: int) -> list[int]:
+        totals = [0] * number_of_players
+        for result in self.run():
+            METRICS.count('matches', result['matches'])
+            for i, total in enumerate(result['totals']):
+                totals[i] += total
+
+        for i, total in enumerate(totals):
+            LOGGER.info('simulate', 'Seat {}: ${:.4f} per match.', i, total / number_of_matches)
+        return totals
+
+
+    # Add up the results of a coordinated file mode run, and print them like file mode.
+    def run_file(self) -> int:
+        number_of_cases = 0
+        number_of_passed = 0
+        for result in self.run():
+            number_of_cases += result['cases']
+            number_of_passed += result['passed']
+            METRICS.count('cases', result['cases'])
+            METRICS.count('cases_failed', result['cases'] - result['passed'])
+            for message in result['messages']:
+                print(message)
+
+        if number_of_cases == 0:
+            print('There is an error while reading test cases directory \'{}\'.'.format(self.job['dir']))
+        else:
+            print('There are {} tests passed.'.format(number_of_passed))
+        return number_of_passed
+
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+    '''This class is the TCP server of a Coordinator, with a thread for every connected worker.
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class CoordinatorHandler(socketserver.StreamRequestHandler):
+    '''This class serves one connected worker of the coordinator until the run is done or the worker is lost.
+    '''
+    def handle(self) -> None:
+        self.server.coordinator.serve(self.connection, self.rfile, self.wfile, '{}:{}'.format(*self.client_address[:2]))
+
+
+class RemoteWorker:
+    '''This class asks a Coordinator for chunks, plays or judges them, and sends back their added up results,
+    until the coordinator says the run is done or goes away.
+
+    Attributes:
+        address: Host and port of the coordinator
+        flop_table: Path of the flop equity table bots look up, or None
+        memo: Kind of hand memo of file mode chunks, or None
+        digests: Digest of the flop table and of the policy file of bots, compared with the ones of a job
+    '''
+    def __init__(self, address: tuple[str, int], flop_table: str = None, memo: str = None):
+        self.address = address
+        self.flop_table = flop_table
+        self.memo = memo
+        self.digests: dict[str, str] = {}
+
+
+    def connect(self) -> socket.socket:
+        for i in range(WORKER_CONNECT_TRIES):
+            try:
+                return socket.create_connection(self.address)
+            except OSError:
+                time.sleep(1.0)
+        raise ConnectionError('no coordinator on {}:{}'.format(*self.address))
+
+
+    def run(self) -> int:
+        """Work on chunks until the run is done.
+
+        Returns:
+            The number of chunks done.
+        """
+        try:
+            connection = self.connect()
+        except ConnectionError as e:
+            LOGGER.warning('coordinate', 'Worker: {}', e)
+            return 0
+
+        flop_table = FlopTable(self.flop_table) if self.flop_table else None
+        self.digests = {'flop_table': Coordinator.file_digest(self.flop_table), 'policy': Coordinator.file_digest(BotPlayer.policy_path)}
+        number_of_chunks = 0
+        with connection, connection.makefile('rb') as reader, connection.makefile('wb') as writer:
+            Coordinator.send_message(writer, {'type': 'ready', 'pid': os.getpid()})
+            while True:
+                try:
+                    message = Coordinator.read_message(reader)
+                    if message['type'] != 'chunk':
+                        break
+                    reason = self.mismatch(message['job'])
+                    if reason is not None:
+                        LOGGER.warning('coordinate', 'Worker: refused chunk {}, {}.', message['index'], reason)
+                        Coordinator.send_message(writer, {'type': 'refuse', 'index': message['index'], 'reason': reason})
+                        break
+                    result = self.work(message['job'], message['first'], message['last'], flop_table, message.get('items'))
+                    Coordinator.send_message(writer, {'type': 'result', 'index': message['index'], 'result': result})
+                except (OSError, ValueError):
+                    break       # The coordinator is done or gone
+                number_of_chunks += 1
+        return number_of_chunks
+
+
+    # Why chunks of job can't be played like the coordinator would, or None if they can.
+    def mismatch(self, job: dict) -> str:
+        if job['mode'] != 'simulation':
+            return None
+        for name in ('flop_table', 'policy'):
+            if job.get(name) != self.digests.get(name):
+                return 'its {} is not the one of the coordinator'.format(name.replace('_', ' '))
+        return None
+
+
+    def work(self, job: dict, first: int, last: int, flop_table: FlopTable, items: list = None) -> dict:
+        if job['mode'] == 'simulation':
+            BotPlayer.action_table = [tuple(action_item) for action_item in job['table']]
+            game = BotGame()
+            game.sampling = job['sampling']
+            game.round_budget = job.get('round_budget')
+            game.number_of_train = job['number_of_train']
+            game.flop_table = flop_table
+            totals = game.play_chunk(job['players'], first, last, job['seed'])
+            return {'matches': last - first, 'totals': totals}
+
+        game = Game()
+        if self.memo:
+            game.hand_memo = HandMemo(suits=self.memo == 'suits')
+        number_of_cases, number_of_passed, messages = game.judge_chunk(job['dir'], items)
+        return {'cases': number_of_cases, 'passed': number_of_passed, 'messages': messages}
+
+
+    @staticmethod
+    def run_workers(address: tuple[str, int], workers: int = None, flop_table: str = None, memo: str = None) -> None:
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers == 1:
+            RemoteWorker(address, flop_table, memo).run()
+            return
+
+        processes = [multiprocessing.Process(target=RemoteWorker(address, flop_table, memo).run) for i in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+
 # game window
 class GameWindow(Game):
     """A class to do operations of gamewindow.
@@ -946,6 +4475,7 @@ class GameWindow(Game):
         self.create_board()
         self.create_players_area(number_of_players)
         self.create_buttons()
+        self.create_equity_area()
 
 
     def create_board(self) -> None:
@@ -956,6 +4486,58 @@ class GameWindow(Game):
         self.bet_pool_text = self.canvas.create_text(320, 280, text="Bet pool: 0", fill ='#7CCDFF', font=BETS_FONT)
 
 
+    def create_equity_area(self) -> None:
+        '''create a progress bar and labels of live equity, refined by a background EquityWorker'''
+        self.equity_worker = EquityWorker()
+        self.equity_progress = ttk.Progressbar(self.window, length=200, maximum=1.0)
+        self.equity_progress.place(x=20, y=20)
+        self.equity_text = self.canvas.create_text(20, 50, anchor=tk.NW, text='', fill='#7CCDFF', font=EQUITY_FONT)
+        self.bots_equity_text = self.canvas.create_text(20, 75, anchor=tk.NW, text='', fill='#7CCDFF', font=EQUITY_FONT)
+        self.bots_equity: dict[str, Equity] = {}
+        self.window.after(EQUITY_POLL_MS, self.poll_equity)
+
+
+    # Start live equity of the human player, and of bot players in test mode, for the cards dealt so far.
+    def start_equity(self) -> None:
+        jobs = []
+        for player in self.all_players:
+            if player.is_fold() or (player is not self.human_player and not TEST_MODE):
+                continue
+
+            number_of_opponents = 0
+            for other in self.all_players:
+                if other is not player and not other.is_fold():
+                    number_of_opponents += 1
+            jobs.append((player.id, list(player.initial_cards), list(self.community_cards), max(1, number_of_opponents)))
+
+        self.bots_equity.clear()
+        self.canvas.itemconfigure(self.equity_text, text='')
+        self.canvas.itemconfigure(self.bots_equity_text, text='')
+        self.equity_progress['value'] = 0
+        self.equity_worker.start(jobs)
+
+
+    def poll_equity(self) -> None:
+        updated = False
+        while not self.equity_worker.results.empty():
+            job_id, id, equity, progress = self.equity_worker.results.get_nowait()
+            if job_id != self.equity_worker.job_id:
+                continue
+
+            self.equity_progress['value'] = progress
+            if id == self.human_player.id:
+                self.canvas.itemconfigure(self.equity_text, text='Your equity: {:.1%} +- {:.1%}'.format(equity.ratio, 2 * equity.stderr))
+            else:
+                self.bots_equity[id] = equity
+                updated = True
+
+        if updated:
+            lines = ['Bot player{}: {:.1%}'.format(id, equity.ratio) for id, equity in self.bots_equity.items()]
+            self.canvas.itemconfigure(self.bots_equity_text, text='\n'.join(lines))
+
+        self.window.after(EQUITY_POLL_MS, self.poll_equity)
+
+
     def create_buttons(self) -> None:
         self.create_bet_spinbox()
         btn = tk.Button(self.window, text="Bet", width=10, command=self.on_bet, font=BUTTON_FONT)
@@ -1072,6 +4654,7 @@ class GameWindow(Game):
         bets = self.spinbox_value.get()
         self.bet_pool += bets
         self.human_player.take_bets(bets)
+        self.record_action(self.human_player, ACTION_BET, bets)
 
         self.update_bet_spinbox()
         self.update_bet_pool()
@@ -1084,10 +4667,13 @@ class GameWindow(Game):
             return
             
         self.human_player.state = ACTION_FOLD
+        self.record_action(self.human_player, ACTION_FOLD, 0)
+        self.equity_worker.stop()
         self.window.after(0, self.play_a_round())
 
 
     def end_match(self):
+        self.equity_worker.stop()
         result_msg = self.check_result()
         self.print_detail()
         self.reset_cards()
@@ -1116,6 +4702,8 @@ class GameWindow(Game):
     def flop_cards(self) -> None:
         Game.deal_cards(self)
         self.update_cards()
+        if self.number_of_round < 3:
+            self.start_equity()
 
 
     def play_a_round(self) -> None:
@@ -1132,6 +4720,7 @@ class GameWindow(Game):
 
         for player in self.bot_players:
             action, bets = player.make_action(limp_bets)
+            self.record_action(player, action, bets)
             if action == ACTION_BET:
                 self.bet_pool += bets
                 if limp_bets < bets:
@@ -1160,6 +4749,7 @@ class GameWindow(Game):
 
         self.window.after(500, self.flop_cards)
         self.window.mainloop()
+        self.close_records()
 
 
     def reset_cards(self):
@@ -1179,35 +4769,416 @@ class GameWindow(Game):
         self.update_bet_pool()
         self.update_bet_spinbox()
         self.update_players_info()
-        self.window.after(500, self.deal_cards)
 
 
 
+class SpectatorWindow:
+    '''This class shows bots playing matches at full speed. Matches are played on a background engine thread,
+    and the window draws the latest state at most SPECTATOR_FPS times a second. The engine only copies the table
+    state when the window has asked for a new frame, so states between two frames are dropped and cost nothing.
+
+    Attributes:
+        game: The game played by bots
+        number_of_players: Number of bots
+        number_of_matches: Number of matches to play, or None to play until the window is closed
+        seed: Seed of matches, every match is seeded from it and its number
+        winnings: Total winnings of every seat
+        latest: The latest table state, replaced by the engine and drawn by the window
+    '''
+    def __init__(self, game: BotGame, number_of_players: int, number_of_matches: int = None, seed: int = 0):
+        self.game = game
+        self.number_of_players = number_of_players
+        self.number_of_matches = number_of_matches
+        self.seed = seed
+        self.winnings = [0] * number_of_players
+        self.matches_played = 0
+        self.frame_wanted = True
+        self.stopped = False
+        self.latest: dict = None
+        self.drawn: dict = None
+        self.start_time = time.perf_counter()
+        self.game.observer = self.observe
+
+
+    def start_engine(self) -> None:
+        self.engine = threading.Thread(target=self.run_engine, daemon=True)
+        self.engine.start()
+
+
+    def run_engine(self) -> None:
+        match = 0
+        while not self.stopped and (self.number_of_matches is None or match < self.number_of_matches):
+            random.seed('{}-{}'.format(self.seed, match))
+            self.game.init_players(self.number_of_players - 1)
+            self.game.play_a_match()
+            METRICS.count('matches')
+
+            for i, player in enumerate(self.game.all_players):
+                self.winnings[i] += player.bet_amount - INITIAL_BET
+            match += 1
+            self.matches_played = match
+            self.observe()
+            self.game.clear_players()
+
+        self.frame_wanted = True
+        self.observe()
+
+
+    # Copy the table state for the next frame, if the window asked for one.
+    def observe(self) -> None:
+        if not self.frame_wanted:
+            return
+
+        self.frame_wanted = False
+        players = []
+        for i, player in enumerate(self.game.all_players):
+            if player.is_fold():
+                action = 'Fold'
+            elif player.is_all_in():
+                action = 'All In'
+            elif player.bets == 0:
+                action = ''
+            else:
+                action = 'Bet {}'.format(player.bets)
+            players.append(('Bot player{}'.format(i), Game.cards_str(player.initial_cards).strip(), player.bet_amount, action, self.winnings[i]))
+
+        elapsed = time.perf_counter() - self.start_time
+        self.latest = {
+            'match': self.matches_played,
+            'rate': self.matches_played / elapsed if elapsed > 0 else 0.0,
+            'board': list(self.game.community_cards),
+            'pool': self.game.bet_pool,
+            'players': players,
+            'done': self.number_of_matches is not None and self.matches_played >= self.number_of_matches,
+        }
+
+
+    def create_window(self) -> None:
+        self.window = tk.Tk()
+        self.window.resizable(False, False)
+        self.window.title("Texas - Spectator")
+        self.window.geometry('1000x440')
+        self.window.protocol('WM_DELETE_WINDOW', self.destroy)
+
+        self.card_img: dict[str, tk.PhotoImage] = {}
+        self.desktop_img = tk.PhotoImage(file='bg.png')
+        for suit, file in (('D', 'diamond.png'), ('H', 'heart.png'), ('C', 'club.png'), ('S', 'spade.png')):
+            self.card_img[suit] = tk.PhotoImage(file=file)
+
+        self.canvas = tk.Canvas(self.window, width=560, height=426)
+        self.canvas.pack(side=tk.LEFT)
+        self.canvas.create_image(10, 10, anchor=tk.NW, image=self.desktop_img)
+
+        columns = ['player', 'cards', 'bets', 'action', 'winnings']
+        self.players_table = ttk.Treeview(master=self.window, height=11, columns=columns, show='headings')
+        for column, width in zip(columns, (110, 90, 50, 80, 80)):
+            self.players_table.heading(column=column, text=column)
+            self.players_table.column(column=column, width=width, minwidth=20, anchor='center')
+        self.players_table.pack(side=tk.LEFT, pady=10)
+        for i in range(self.number_of_players):
+            self.players_table.insert('', index=i, text='', values=('', '', '', '', ''))
+
+
+    def draw(self) -> None:
+        state = self.latest
+        if state is not None and state is not self.drawn:
+            self.drawn = state
+            self.canvas.delete('frame')
+            self.canvas.create_text(280, 40, text='Match {}  ({:.1f} matches/s)'.format(state['match'], state['rate']), fill='#7CCDFF', font=EQUITY_FONT, tags='frame')
+            self.canvas.create_text(280, 280, text='Bet pool: {}'.format(state['pool']), fill='#7CCDFF', font=BETS_FONT, tags='frame')
+
+            x_pos = 160
+            for card in state['board']:
+                self.canvas.create_image(x_pos, 220, image=self.card_img[card.suit], tags='frame')
+                self.canvas.create_text(x_pos, 215, text=CARD_VALUES[card.value], fill='#000000', font=CARD_FONT, tags='frame')
+                x_pos += 60
+
+            items = self.players_table.get_children()
+            for item, values in zip(items, state['players']):
+                self.players_table.item(item, values=values)
+
+        if state is None or not state['done']:
+            self.frame_wanted = True
+            self.window.after(1000 // SPECTATOR_FPS, self.draw)
+
+
+    def destroy(self) -> None:
+        self.stopped = True
+        self.window.quit()
+
+
+    def run_spectator_mode(self) -> None:
+        self.create_window()
+        self.start_engine()
+        self.window.after(0, self.draw)
+        self.window.mainloop()
+        self.stopped = True
+        self.engine.join()      # The engine stops after its match, before the history is closed
+        self.game.close_records()
+
+
 if __name__=="__main__":
     parser = argparse.ArgumentParser()
     group = parser.add_mutually_exclusive_group()
     group.add_argument('-u', action="store_true", help='run as user mode')
     group.add_argument('-f', action="store_true", help='run as ile mode')
+    group.add_argument('-r', action="store_true", help='run as replay mode, verify hand history given by -i')
+    group.add_argument('-g', action="store_true", help='run as generator mode, write -n labeled test cases to directory given by -o')
+    group.add_argument('-s', action="store_true", help='run as simulation mode, play -n matches of -p bots')
+    group.add_argument('-w', action="store_true", help='run as spectator mode, watch -p bots play -n matches, or until the window is closed')
+    group.add_argument('-t', action="store_true", help='run as tuner mode, search action table for -p bots and save it to -o')
+    group.add_argument('--build-policy', metavar='path', type=str, help='solve bot policy table to path on all cores')
+    group.add_argument('--build-flop-table', metavar='path', type=str, help='build flop equity table to path on all cores')
+    group.add_argument('--equity', metavar='range', nargs='+', help='equity of 2 to 10 hand ranges like QQ+,AKs and --board')
+    group.add_argument('--equity-batch', metavar='path', type=str, help='equity of every spot of a batch file, written to -o as csv')
+    group.add_argument('--query', metavar='path', type=str, help='average --value of an outcome store by --group-by columns')
+    group.add_argument('--worker', metavar='host:port', type=str, help='run --workers processes playing or judging chunks of the coordinator on host:port')
+    group.add_argument('--draws', metavar='cards', type=str, help='count exact rank odds and outs of cards like S1,S13,S10,S9,D4, hole cards first')
 
     group = parser.add_mutually_exclusive_group()
     group.add_argument('-p', metavar='num', type=int, help='number of players you want to play with, 0 < num < 10')
-    group.add_argument('-i', metavar='path', type=str, help='path_to_test_cases_directory')
+    group.add_argument('-i', metavar='path', type=str, help='path_to_test_cases_directory or path_to_hand_history')
+
+    parser.add_argument('-o', metavar='path', type=str, help='path of output directory or file')
+    parser.add_argument('-n', metavar='num', type=int, help='number of test cases to generate')
+    parser.add_argument('--seed', metavar='num', type=int, default=0, help='seed of random generator')
+    parser.add_argument('--search', choices=TUNE_SEARCHES, default='evolve', help='search method of tuner mode')
+    parser.add_argument('--matches', metavar='num', type=int, default=TUNE_MATCHES, help='number of matches every candidate table is scored with')
+    parser.add_argument('--table', metavar='path', type=str, help='bots load action table from path')
+    parser.add_argument('--policy', metavar='path', type=str, help='bots decide by policy table from path instead of training')
+    parser.add_argument('--history', metavar='path', type=str, help='append hand history of user mode to path')
+    parser.add_argument('--cache', metavar='path', nargs='?', const='', help='keep judged results of file mode in a cache, default {} in test cases directory'.format(VERDICT_CACHE_FILE))
+    parser.add_argument('--results', metavar='path', type=str, help='stream the result of every file mode case to path as JSON lines, or JUnit XML if path ends with .xml')
+    parser.add_argument('--results-format', choices=RESULT_FORMATS, help='format of --results instead of the one given by its extension')
+    parser.add_argument('--fail-fast', metavar='num', type=int, help='stop file mode after num failed or unreadable cases')
+    parser.add_argument('--memo', choices=['exact', 'suits'], help='share ranks of same hands across file mode cases, suits also matches hands with swapped suits')
+    parser.add_argument('--flop-table', metavar='path', type=str, help='bots look up flop equity in this table')
+    parser.add_argument('--samples', metavar='num', type=int, help='number of deals of every equity in offline tools, default {} for the flop table and {} for the tuner'.format(FLOP_TABLE_SAMPLES, TUNE_TRAIN))
+    parser.add_argument('--workers', metavar='num', type=int, help='number of worker processes, default number of cores')
+    parser.add_argument('--sampling', choices=SAMPLINGS, help='train bots with equity estimated by this sampling strategy')
+    parser.add_argument('--board', metavar='cards', type=str, default='', help='board cards of equity mode like S10,S9,D4')
+    parser.add_argument('--round-budget', metavar='ms', type=float, help='bots share ms milliseconds to estimate their equity in every round, instead of a fixed number of deals')
+    parser.add_argument('--outcomes', metavar='path', type=str, help='record the outcome of every player to the outcome store directory path')
+    parser.add_argument('--group-by', metavar='columns', type=str, default='hand_class', help='comma separated columns of outcome query, default hand_class')
+    parser.add_argument('--value', metavar='column', type=str, default='won', help='column averaged by outcome query, default won')
+    parser.add_argument('--where', metavar='condition', action='append', default=[], help='filter of outcome query like players=6 or rank<=3, may be repeated')
+    parser.add_argument('--evaluator', metavar='operation=backend', action='append', default=[], help='backend of rank or equity, like rank=table or equity=numpy, may be repeated')
+    parser.add_argument('--autotune', metavar='path', nargs='?', const=AUTOTUNE_FILE, help='use the fastest evaluator backends on this host, timed once and cached in path, default {}'.format(AUTOTUNE_FILE))
+    parser.add_argument('--shared-cache', metavar='path', type=str, help='share hand ranks and equities with worker processes in this file')
+    parser.add_argument('--coordinator', metavar='host:port', type=str, help='hand out simulation or file mode in chunks to workers connecting to host:port')
+    parser.add_argument('--chunk', metavar='num', type=int, default=COORDINATOR_CHUNK, help='number of matches or test cases of a coordinator chunk, default {}'.format(COORDINATOR_CHUNK))
+    parser.add_argument('--checkpoint', metavar='path', type=str, help='save progress of simulation or file mode to path every {:g} seconds'.format(CHECKPOINT_INTERVAL))
+    parser.add_argument('--resume', action="store_true", help='resume simulation or file mode from --checkpoint')
+    parser.add_argument('--metrics-port', metavar='port', type=int, help='serve metrics on http://127.0.0.1:port/metrics')
+    parser.add_argument('--metrics-file', metavar='path', type=str, help='write metrics as JSON to path every {:g} seconds'.format(METRICS_INTERVAL))
+    parser.add_argument('--log-level', choices=list(LOG_LEVELS), help='lowest level of game events to print')
+    parser.add_argument('--log-json', action="store_true", help='print game events as JSON lines')
 
     args = parser.parse_args()
     invalid_args = False
 
+    if args.log_level:
+        LOGGER.level = LOG_LEVELS[args.log_level]
+    LOGGER.json_format = args.log_json
+
+    if args.coordinator and (args.checkpoint or args.history or args.outcomes or args.cache is not None or args.results or args.fail_fast):
+        parser.error('--coordinator does not keep a checkpoint, hand history, outcome store, verdict cache or result sink')
+    if args.fail_fast is not None and args.fail_fast < 1:
+        parser.error('--fail-fast must be at least 1')
+    if args.round_budget is not None and args.round_budget <= 0:
+        parser.error('--round-budget must be positive')
+    round_budget = args.round_budget / 1000 if args.round_budget is not None else None
+
+    if args.autotune:
+        for operation, name in Evaluators.autotune(args.autotune).items():
+            LOGGER.info('autotune', 'Evaluator of {}: {}', operation, name)
+    for evaluator in args.evaluator:
+        operation, _, name = evaluator.partition('=')
+        if name not in Evaluators.backends.get(operation, {}):
+            parser.error('unknown evaluator {}, choose from {}'.format(evaluator,
+                ', '.join('{}={}'.format(operation, name) for operation in Evaluators.backends for name in Evaluators.backends[operation])))
+        Evaluators.use(operation, name)
+    if args.shared_cache:
+        SharedCache.install(args.shared_cache)
+    if args.metrics_port:
+        METRICS.serve(args.metrics_port)
+    if args.metrics_file:
+        METRICS.write_periodically(args.metrics_file)
+
+    if args.table:
+        BotPlayer.action_table = BotPlayer.load_action_table(args.table)
+    BotPlayer.policy_path = args.policy
+
     if args.u and args.p: # Check whether the command line is under user mode form.
         if args.p < 1 or args.p > 9:
             invalid_args = True
         else:
             try:
                 game = GameWindow()
+                game.sampling = args.sampling
+                game.round_budget = round_budget
+                if args.flop_table:
+                    game.flop_table = FlopTable(args.flop_table)
+                if args.history:
+                    game.hand_history = HandHistory(args.history)
+                if args.outcomes:
+                    game.outcome_store = OutcomeStore(args.outcomes)
                 game.run_user_mode(args.p)
             except:
                 invalid_args = True
     elif args.f and args.i:   # Check whether the command line is under file mode form.
+        cache_path = None
+        if args.cache == '':
+            cache_path = os.path.abspath(os.path.join(args.i, VERDICT_CACHE_FILE))
+        elif args.cache:
+            cache_path = os.path.abspath(args.cache)
+
+        results_path = os.path.abspath(args.results) if args.results else None
+        checkpoint = None
+        if args.checkpoint:
+            run = {'mode': 'file', 'dir': os.path.abspath(args.i), 'cache': cache_path, 'results': results_path,
+                'results_format': args.results_format}
+            checkpoint = Checkpoint(os.path.abspath(args.checkpoint), run, args.resume)
+
+        if args.coordinator:
+            dir_path = os.path.abspath(args.i)
+            try:
+                test_cases = list(TestCases.read_results(dir_path))
+            except (OSError, csv.Error):
+                test_cases = []
+            job = {'mode': 'file', 'dir': dir_path}
+            Coordinator(Coordinator.parse_address(args.coordinator), job, len(test_cases), args.chunk, items=test_cases).run_file()
+        else:
+            game = Game()
+            if args.memo:
+                game.hand_memo = HandMemo(suits=args.memo == 'suits')
+            sink = None
+            if results_path:
+                sink = ResultSink(results_path, args.results_format, resume=args.resume)
+            try:
+                game.run_file_mode(args.i, cache_path, checkpoint, sink, args.fail_fast)
+            except ValueError as e:
+                print(e)
+            finally:
+                if sink is not None:
+                    sink.close()
+        LOGGER.flush()
+    elif args.r and args.i:   # Check whether the command line is under replay mode form.
         game = Game()
-        game.run_file_mode(args.i)
+        game.run_replay_mode(args.i)
+    elif args.g and args.o and args.n and not args.i:    # Check whether the command line is under generator mode form.
+        if args.p and not 2 <= args.p <= 10:
+            invalid_args = True
+        else:
+            CorpusGenerator(args.o, args.seed, args.p).generate(args.n, args.workers)
+            LOGGER.flush()
+    elif args.s and args.p and args.n:    # Check whether the command line is under simulation mode form.
+        if args.p < 2 or args.p > 10:
+            invalid_args = True
+        elif args.coordinator:
+            job = Coordinator.simulation_job(args.p, args.seed, args.sampling, round_budget, flop_table=args.flop_table, policy=args.policy)
+            Coordinator(Coordinator.parse_address(args.coordinator), job, args.n, args.chunk).run_simulation(args.p, args.n)
+            LOGGER.flush()
+        else:
+            game = BotGame()
+            game.sampling = args.sampling
+            game.round_budget = round_budget
+            if args.flop_table:
+                game.flop_table = FlopTable(args.flop_table)
+            if args.history:
+                game.hand_history = HandHistory(args.history)
+            if args.outcomes:
+                game.outcome_store = OutcomeStore(args.outcomes)
+
+            checkpoint = None
+            if args.checkpoint:
+                run = {'mode': 'simulation', 'players': args.p, 'matches': args.n, 'seed': args.seed, 'sampling': args.sampling,
+                    'flop_table': args.flop_table, 'policy': args.policy, 'table': args.table, 'history': args.history, 'outcomes': args.outcomes}
+                checkpoint = Checkpoint(args.checkpoint, run, args.resume)
+            try:
+                game.run_simulation_mode(args.p, args.n, args.seed, checkpoint)
+            except ValueError as e:
+                LOGGER.warning('checkpoint', '{}', e)
+            game.close_records()
+            LOGGER.flush()
+    elif args.w and args.p:    # Check whether the command line is under spectator mode form.
+        if args.p < 2 or args.p > 10:
+            invalid_args = True
+        else:
+            if not args.log_level:
+                LOGGER.level = max(LOGGER.level, LOG_WARNING)
+            game = BotGame()
+            game.sampling = args.sampling
+            game.round_budget = round_budget
+            if args.flop_table:
+                game.flop_table = FlopTable(args.flop_table)
+            if args.history:
+                game.hand_history = HandHistory(args.history)
+            if args.outcomes:
+                game.outcome_store = OutcomeStore(args.outcomes)
+            SpectatorWindow(game, args.p, args.n, args.seed).run_spectator_mode()
+            LOGGER.flush()
+    elif args.t and args.p and args.o:    # Check whether the command line is under tuner mode form.
+        if args.p < 2 or args.p > 10:
+            invalid_args = True
+        else:
+            tuner = StrategyTuner(args.p, args.matches, args.samples or TUNE_TRAIN, args.seed)
+            table, score = tuner.tune(args.search, args.workers)
+            BotPlayer.save_action_table(table, args.o)
+            LOGGER.info('tune', 'Tuner: best table wins ${:.4f} per match, saved to \'{}\'.', score, args.o)
+            LOGGER.flush()
+    elif args.worker:
+        RemoteWorker.run_workers(Coordinator.parse_address(args.worker), args.workers, args.flop_table, args.memo)
+        LOGGER.flush()
+    elif args.build_policy:
+        PolicyTable.build(args.build_policy, args.n or POLICY_SAMPLES, args.workers)
+    elif args.build_flop_table:
+        FlopTable.build(args.build_flop_table, args.samples or FLOP_TABLE_SAMPLES, args.workers)
+        LOGGER.flush()
+    elif args.equity:
+        calculator = RangeCalculator(args.n or RANGE_SAMPLES, args.seed, args.workers)
+        try:
+            board = HandHistory.decode_cards(args.board.replace(',', ' ').split())
+            result = calculator.calculate(args.equity, board)
+        except (ValueError, IndexError):
+            invalid_args = True
+        else:
+            RangeCalculator.print_result(args.equity, result)
+        calculator.close()
+        LOGGER.flush()
+    elif args.equity_batch:
+        calculator = RangeCalculator(args.n or RANGE_SAMPLES, args.seed, args.workers)
+        calculator.run_batch(args.equity_batch, args.o)
+        calculator.close()
+        LOGGER.flush()
+    elif args.query:
+        try:
+            store = OutcomeStore(args.query)
+            group_by = [name.strip() for name in args.group_by.split(',') if name.strip()]
+            names = dict(OUTCOME_COLUMNS)
+            if args.value not in names or not all(name in names for name in group_by):
+                raise ValueError
+            rows = store.query(group_by, args.value, [OutcomeStore.parse_condition(condition) for condition in args.where])
+        except ValueError:
+            invalid_args = True
+        else:
+            LOGGER.flush()
+            print('{}{:>10}{:>12}'.format(''.join('{:<16}'.format(name) for name in group_by), 'rows', args.value))
+            for row in rows:
+                groups = ''.join('{:<16}'.format(OutcomeStore.format_value(name, value)) for name, value in zip(group_by, row))
+                print('{}{:>10}{:>12.4f}'.format(groups, row[-2], row[-1]))
+    elif args.draws:
+        try:
+            cards = HandHistory.decode_cards(args.draws.replace(',', ' ').split())
+            calculator = DrawCalculator(cards[:2], cards[2:])
+        except (ValueError, IndexError):
+            invalid_args = True
+        else:
+            LOGGER.flush()
+            for rank_name, probability in calculator.probabilities().items():
+                print('{:<16}{:>8.2%}'.format(rank_name, probability))
+            for rank_name, outs in calculator.outs().items():
+                print('Outs to {}: {} ({})'.format(rank_name, len(outs), ' '.join(HandHistory.encode_cards(outs))))
     else:
         invalid_args = True         # Other forms that are not under required forms are rejected.
 
@@ -0,0 +1,73 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from project import BotGame, Coordinator, RemoteWorker, METRICS
+
+NUMBER_OF_PLAYERS = 3
+NUMBER_OF_MATCHES = 12
+CHUNK = 2
+NUMBER_OF_TRAIN = 100       # Deals bots train with, few to keep matches fast
+SEED = 7
+
+
+class StallingWorker(RemoteWorker):
+    '''A worker that plays its first chunk, then says so and stalls in its second chunk until it is killed.'''
+    def __init__(self, address, stalled):
+        super().__init__(address)
+        self.stalled = stalled
+        self.number_of_chunks = 0
+
+
+    def work(self, job, first, last, flop_table, items=None):
+        self.number_of_chunks += 1
+        if self.number_of_chunks == 2:
+            self.stalled.set()
+            time.sleep(60)
+        return super().work(job, first, last, flop_table, items)
+
+
+def undisturbed_totals():
+    totals = [0] * NUMBER_OF_PLAYERS
+    for first in range(0, NUMBER_OF_MATCHES, CHUNK):
+        game = BotGame()
+        game.number_of_train = NUMBER_OF_TRAIN
+        for i, total in enumerate(game.play_chunk(NUMBER_OF_PLAYERS, first, min(first + CHUNK, NUMBER_OF_MATCHES), SEED)):
+            totals[i] += total
+    return totals
+
+
+def test_totals_survive_a_killed_worker():
+    job = Coordinator.simulation_job(NUMBER_OF_PLAYERS, SEED, number_of_train=NUMBER_OF_TRAIN)
+    coordinator = Coordinator(('127.0.0.1', 0), job, NUMBER_OF_MATCHES, CHUNK)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(coordinator.run_simulation(NUMBER_OF_PLAYERS, NUMBER_OF_MATCHES)), daemon=True)
+    thread.start()
+    assert coordinator.listening.wait(10)
+
+    context = multiprocessing.get_context('spawn')
+    stalled = context.Event()
+    reassigned = METRICS.counters['chunks_reassigned']
+    stalling = context.Process(target=StallingWorker(coordinator.address, stalled).run)
+    stalling.start()
+    healthy = None
+    try:
+        assert stalled.wait(120)
+        healthy = context.Process(target=RemoteWorker(coordinator.address).run)
+        healthy.start()
+        stalling.kill()         # Lost in the middle of its second chunk
+        thread.join(300)
+        assert not thread.is_alive()
+    finally:
+        stalling.kill()
+        stalling.join()
+        if healthy is not None:
+            healthy.join(60)
+            healthy.kill()
+
+    assert METRICS.counters['chunks_reassigned'] == reassigned + 1
+    assert results == [undisturbed_totals()]
@@ -0,0 +1,39 @@
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from project import BotGame, DeadlineScheduler, LOGGER, LOG_WARNING, SAMPLING_STRATIFIED
+
+NUMBER_OF_PLAYERS = 6
+NUMBER_OF_MATCHES = 100
+ROUND_BUDGET = 0.005        # Seconds of the budget, short enough for the overhead of chunks to matter
+
+
+def round_seconds(monkeypatch, sampling):
+    seconds = []
+    run = DeadlineScheduler.run
+
+    def timed_run(scheduler):
+        run(scheduler)
+        seconds.append(time.perf_counter() - scheduler.start_time)
+
+    monkeypatch.setattr(DeadlineScheduler, 'run', timed_run)
+    monkeypatch.setattr(LOGGER, 'level', LOG_WARNING)
+    game = BotGame()
+    game.round_budget = ROUND_BUDGET
+    game.sampling = sampling
+    game.play_chunk(NUMBER_OF_PLAYERS, 0, NUMBER_OF_MATCHES, 1)
+    return seconds
+
+
+def test_rounds_stay_within_the_budget(monkeypatch):
+    for sampling in (None, SAMPLING_STRATIFIED):
+        seconds = round_seconds(monkeypatch, sampling)
+        within = sum(1 for round_time in seconds if round_time <= ROUND_BUDGET)
+
+        # A deal or a garbage collection slower than any measured can still overrun a round now and then.
+        assert statistics.median(seconds) <= ROUND_BUDGET, sampling
+        assert within >= 0.95 * len(seconds), (sampling, sorted(seconds)[-5:])